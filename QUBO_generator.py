@@ -1,43 +1,71 @@
 """
 QUBO_generator - file to generate QUBO matrixes for problem
-example: python QUBO_generator.py
+example: python QUBO_generator.py problem_number (workers)
+convert older dense matrix files: python QUBO_generator.py convert files/QUBO_matrix1.npz
 """
-import numpy as np
 import sys
 
-from encoders.QUBO_encoder import makeQubo
-from helpers.helpers_functions import getProblem
-from solution_analysis import readScheduleXml
+from encoders.QUBO_encoder import indexingForQubo, quboFamilies
+from helpers.helpers_functions_cache import cacheKey, cachedProblem, cachedQubo, problemParameters, loadCachedStatistics, saveCachedStatistics
+from helpers.helpers_functions_matrix import saveQuboMatrix, convertQuboMatrix
+from helpers.helpers_functions_statistics import quboStatistics, saveQuboStatistics
 
-def analyseQubo(Q):
+def printStatistics(statistics):
     """
-    Function analyse degree of completness of the graph represented by symmetric QUBO matrix
+    Function to print statistics of the QUBO graph
     """
-    s = np.size(Q,0)
-    k = 0
-    for i in range(s):
-        for j in range(i+1, s):
-            if Q[i][j] != 0.:
-                k = k+1
-
-    print("n.o. qbits = ", s)
-    print("n.o. edges = ", k)
+    print("n.o. qbits = ", statistics["qubits"])
+    print("n.o. edges = ", statistics["edges"])
+    print("max degree = ", statistics["degree"]["max"])
+    for name, family in statistics.get("families", {}).items():
+        print(f"{name}: {family['linear_terms']} linear terms, {family['edges']} edges")
     print(".................................")
 
-def saveMatrix(problem):
+def analyseQubo(Q, families=None, q_bits=None):
     """
-    Function to make and save QUBO matrix as file
+    Function analyse degree of completness of the graph represented by symmetric QUBO matrix
+    """
+    statistics = quboStatistics(Q, families, q_bits)
+    printStatistics(statistics)
+    return statistics
+
+def saveMatrix(problem, workers=1):
+    """
+    Function to make and save QUBO matrix as file, with its statistics as JSON file.
+    Parsed problem, matrix and statistics are taken from cache when the timetable was already encoded
     """
     xml_file = f"data/LDZ_timetable_filtered{problem}.xml"
-    taus, trains_timing, trains_routes = readScheduleXml(xml_file)
-    prob = getProblem(problem, taus, trains_timing, trains_routes)
+    prob = cachedProblem(xml_file, problem)
+    key = cacheKey(xml_file, problemParameters(prob))
     file = f'files/QUBO_matrix{problem}.npz'
+    statistics_file = f'files/QUBO_matrix{problem}_stats.json'
     print("---------graph analysis---------")
-    Q = makeQubo(prob)
-    analyseQubo(Q)
+    Q = cachedQubo(xml_file, prob, workers)
+    _, q_bits = indexingForQubo(prob.trains_routes, prob.trains_timing, prob.d_max)
+    statistics = loadCachedStatistics(key)
+    if statistics is None:
+        statistics = analyseQubo(Q, quboFamilies(prob), q_bits)
+        saveCachedStatistics(key, statistics)
+    else:
+        printStatistics(statistics)
     print(f"save QUBO matrix file to {file}")
-    np.savez(file, Q=Q)
+    saveQuboMatrix(file, Q, q_bits=q_bits)
+    saveQuboStatistics(statistics_file, statistics)
+
+def convertMatrices(files):
+    """
+    Function to convert QUBO matrix files saved in older dense format to sparse format
+    """
+    for file in files:
+        if convertQuboMatrix(file):
+            print(f"converted {file} to sparse format")
+        else:
+            print(f"{file} is already in sparse format")
 
 if __name__ == "__main__":
+    if sys.argv[1] == "convert":
+        convertMatrices(sys.argv[2:])
+        sys.exit()
     problem = int(sys.argv[1])
-    saveMatrix(problem)
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    saveMatrix(problem, workers)
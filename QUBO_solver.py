@@ -1,47 +1,56 @@
 """
 Solver to solve the generated QUBO matrix, with diferent method
-example: python Qfile_solve.py 'solver type(simulated, quantum)' 0 0 
+example: python QUBO_solver.py problem_number 'solver type(simulated, quantum)' num_reads annealing_time
+simulated annealing profile: python QUBO_solver.py 1 simulated 1000 --workers 4 --sweeps 4000 --beta-range 5 100 --seed 1
+or from JSON file: python QUBO_solver.py 1 simulated --config annealing.json
 """
-import pickle
+import argparse
 import os
-import neal
-import numpy as np
-import dimod
-import sys
-import dwave.inspector
 
-from dwave.system import EmbeddingComposite, DWaveSampler
+from helpers.helpers_functions_annealing import annealingProfile, parallelSimAnnealing
+from encoders.QUBO_encoder import indexingForQubo, groupIndices
+from helpers.helpers_functions_embedding import CHAIN_STRENGTHS, quantumSampler, localSampler, cachedEmbedding, sampleChainStrengths
+from helpers.helpers_functions_cache import cacheKey, loadCachedQubo, cachedProblem
+from helpers.helpers_functions_matrix import loadQuboMatrix, quboToBqm
+from helpers.helpers_functions_samples import saveSampleset
 
 def annealingSolution(problem):
     """
-    Function to create a binary quadratic model from a QUBO problem
+    Function to create a binary quadratic model from a QUBO problem (cached matrix or matrix file)
     """
-    Q_init = np.load(f'files/QUBO_matrix{problem}.npz')
-    Q = Q_init['Q'].astype(np.float32)
-    model = dimod.BinaryQuadraticModel(Q, "BINARY")
-    qubo, offset = model.to_qubo()
-    return qubo
+    Q = loadCachedQubo(cacheKey(f"data/LDZ_timetable_filtered{problem}.xml"))
+    if Q is None:
+        Q = loadQuboMatrix(f'files/QUBO_matrix{problem}.npz')
+    return quboToBqm(Q)
 
-def simAnnealing(problem):
+def oneHotGroups(problem):
     """
-    Function to get the SIMULATED annealing results
+    Function to return lists of qubits of one hot groups (delays of train at station) of the problem
     """
-    s = neal.SimulatedAnnealingSampler()
-    sampleset = s.sample_qubo(annealingSolution(problem), beta_range=(5,100), num_sweeps=4000, num_reads=1000, beta_schedule_type='geometric')
-    dwave.inspector.show(sampleset)
+    Problem = cachedProblem(f"data/LDZ_timetable_filtered{problem}.xml", problem)
+    inds, _ = indexingForQubo(Problem.trains_routes, Problem.trains_timing, Problem.d_max)
+    return list(groupIndices(inds).values())
 
-    return sampleset
+def simAnnealing(problem, profile=None):
+    """
+    Function to get the SIMULATED annealing results, reads of the profile are split across workers
+    """
+    if profile is None:
+        profile = annealingProfile()
+    print(f"{profile['num_reads']} reads, {profile['num_sweeps']} sweeps, {profile['workers']} workers, {profile['engine']} engine")
+    return parallelSimAnnealing(annealingSolution(problem), profile, oneHotGroups(problem) if profile["engine"] == "swap" else None)
 
-def realAnnealing(num_reads, annealing_time, chain_strength, problem):
+def realAnnealing(num_reads, annealing_time, problem, chain_strengths=CHAIN_STRENGTHS, local=False):
     """
-    Function to get the QUANTUM annealing results
+    Function to get the QUANTUM annealing results {chain_strength: sampleset}, the model is loaded and embedded once
+    (embedding is cached) and runs of all chain strengths are submitted concurrently (local - simulated stand in of the QPU)
     """
-    sampler = EmbeddingComposite(DWaveSampler(token = ''))
-    sampleset = sampler.sample_qubo(annealingSolution(problem), num_reads=num_reads, auto_scale='true', annealing_time=annealing_time, chain_strength=chain_strength)
-   
-    return sampleset
+    sampler = localSampler() if local else quantumSampler()
+    bqm = annealingSolution(problem)
+    embedding = cachedEmbedding(bqm, sampler)
+    return sampleChainStrengths(bqm, sampler, embedding, chain_strengths, num_reads=num_reads, auto_scale=True, annealing_time=annealing_time)
 
-def annealingResults(problem, annealing, num_reads, annealing_time):
+def annealingResults(problem, annealing, num_reads, annealing_time, profile=None, inspect=False, local=False):
     """
     Function to select annealing acording to what problem was selected
     """
@@ -49,47 +58,55 @@ def annealingResults(problem, annealing, num_reads, annealing_time):
     print(f'Settings model, solving with {annealing} annealing')
 
     if annealing == 'simulated':
-        sampleset = simAnnealing(problem)         
-        results=[]
-        for datum in sampleset.data():
-            x = dimod.sampleset.as_samples(datum.sample)[0][0]
-            results.append((x, datum.energy))
-
-        sdf = sampleset.to_serializable()
-        with open(f"files/QUBO_complete_sol_sim_anneal{problem}", 'wb') as handle:
-            pickle.dump(sdf, handle)
-        with open(f"files/QUBO_samples_sol_sim_anneal{problem}", 'wb') as handle:
-            pickle.dump(results, handle)
+        sampleset = simAnnealing(problem, profile)
+        if inspect:
+            import dwave.inspector
+            dwave.inspector.show(sampleset)
+        saveSampleset(f"files/QUBO_complete_sol_sim_anneal{problem}", sampleset, problem=problem)
 
     elif annealing == 'quantum':
-        for chain_strength in [3,3.5,4,4.5]:
-            sampleset = realAnnealing(num_reads, annealing_time, chain_strength, problem)
-            results=[]
-
-            for datum in sampleset.data():
-                x = dimod.sampleset.as_samples(datum.sample)[0][0]
-                results.append((x, datum.energy))
-
-            sdf = sampleset.to_serializable()
-            fname_comp = f"files/dwave_data/QUBO_complete_sol_real_anneal_problem{problem}_numread{num_reads}_antime{annealing_time}_chainst{chain_strength}"
-            fname_samp = f"files/dwave_data/QUBO_samples_sol_real_anneal_problem{problem}_numread{num_reads}_antime{annealing_time}_chainst{chain_strength}"
-
-            os.makedirs(os.path.dirname(fname_comp), exist_ok = True)
-            os.makedirs(os.path.dirname(fname_samp), exist_ok = True)
+        for chain_strength, sampleset in realAnnealing(num_reads, annealing_time, problem, local=local).items():
+            fname = f"files/dwave_data/QUBO_complete_sol_real_anneal_problem{problem}_numread{num_reads}_antime{annealing_time}_chainst{chain_strength}"
+            os.makedirs(os.path.dirname(fname), exist_ok = True)
+            saveSampleset(fname, sampleset, problem=problem, chain_strength=chain_strength, annealing_time=annealing_time)
 
-            with open(fname_comp, 'wb') as handle:
-                pickle.dump(sdf, handle)
-
-            with open(fname_samp, 'wb') as handle:
-                pickle.dump(results, handle)
-
-            print('Energy {} with chain strength {} run'.format(sampleset.first, chain_strength))
+            print('Energy {} with chain strength {} run'.format(sampleset.first.energy, chain_strength))
     
     print('------------END--------------')
 
-problem = int(sys.argv[1])
-annealing = str(sys.argv[2])
-num_reads = int(sys.argv[3]) 
-annealing_time = int(sys.argv[4]) 
-
-annealingResults(problem, annealing, num_reads, annealing_time)
\ No newline at end of file
+def parseArguments(argv=None):
+    """
+    Function to parse command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Solve generated QUBO matrix with simulated or quantum annealing")
+    parser.add_argument("problem", type=int)
+    parser.add_argument("annealing", choices=["simulated", "quantum"])
+    parser.add_argument("num_reads", type=int, nargs="?", default=0, help="number of reads (0 - from profile for simulated annealing)")
+    parser.add_argument("annealing_time", type=int, nargs="?", default=0, help="annealing time of quantum annealing (required with num_reads for quantum annealing)")
+    parser.add_argument("--config", help="JSON file with simulated annealing profile")
+    parser.add_argument("--workers", type=int, help="number of processes for simulated annealing (0 - all cores)")
+    parser.add_argument("--sweeps", type=int, help="number of sweeps of simulated annealing")
+    parser.add_argument("--beta-range", type=float, nargs=2, help="initial and final inverse temperature")
+    parser.add_argument("--beta-schedule", choices=["linear", "geometric"], help="interpolation of inverse temperature")
+    parser.add_argument("--engine", choices=["neal", "numpy", "tabu", "swap"], help="simulated annealing engine (numpy, tabu and swap - solvers/QUBO_annealer.py)")
+    parser.add_argument("--seed", type=int, help="seed of simulated annealing, workers get seeds spawned from it")
+    parser.add_argument("--local", action="store_true", help="run quantum annealing on local simulated stand in of the QPU")
+    parser.add_argument("--inspect", action="store_true", help="show simulated annealing results in dwave.inspector")
+    args = parser.parse_args(argv)
+    if args.annealing == "quantum" and (args.num_reads <= 0 or args.annealing_time <= 0):
+        parser.error("quantum annealing needs positive num_reads and annealing_time")
+    return args
+
+if __name__ == "__main__":
+    args = parseArguments()
+    profile = annealingProfile(
+        args.config,
+        num_reads=args.num_reads or None,
+        num_sweeps=args.sweeps,
+        beta_range=args.beta_range,
+        beta_schedule_type=args.beta_schedule,
+        seed=args.seed,
+        engine=args.engine,
+        workers=args.workers,
+    )
+    annealingResults(args.problem, args.annealing, args.num_reads, args.annealing_time, profile, args.inspect, args.local)
\ No newline at end of file
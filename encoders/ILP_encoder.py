@@ -4,7 +4,7 @@ Encoder for ILP/MPL solver
 import itertools
 import pulp as pus
 
-from helpers.helpers_functions_QUBO  import departureStationForSwitches, edt, tau, previousStation, occursAsPair
+from helpers.helpers_functions_QUBO  import departureStationForSwitches, edt, tau, previousStation, indexedPair
 from helpers.helpers_functions_ILP import canMO, trainsEnteringViaSameSwitches, getM, updateDictOfDicts
 from helpers.helpers_functions import toDateTime
 
@@ -232,7 +232,7 @@ def keepTrainsOrder(s, t, tp, problem, y, train_sets):
     if sp in train_sets["T0"].keys():
         if s in train_sets["T0"][sp].keys():
             # if both trains goes sp -> s and have common path
-            if occursAsPair(t, tp, train_sets["Ttrack"][s]):
+            if indexedPair(train_sets, "Ttrack", s, t, tp):
                 if not canMO(t, tp, s, train_sets):
                     # the order on station y[j][jp][s] must be the same as
                     # on the path y[j][jp][sp] (previous station)
@@ -3,22 +3,49 @@ Encodes problem to QUBO
 """
 import itertools
 import numpy as np
-from helpers.helpers_functions_QUBO import subsequentStation, occursAsPair, edt, tau, departureStationForSwitches
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import scipy.sparse as sp
+from helpers.helpers_functions_QUBO import subsequentStation, previousStation, indexedPair, switchesOfPair, edt, tau, departureStationForSwitches
+from encoders.QUBO_index import X_VARIABLE, Z_VARIABLE, newIndex, concatenateIndices
+from encoders.QUBO_vectorized import vectorizedCouplings, vectorizedFamilies
+from helpers.helpers_functions_matrix import quboToBqm, upperTriangular
 
 def indexingForQubo(trains_routes, trains_timing, d_max):
     """
-    Function to return vector of dicts of trains stations, delays and stop at the station {"j": j, "s": s, "d": d, "a": a}
+    Function to return index (QuboIndex) of trains stations, delays and stop at the station {"t": t, "s": s, "d": d, "a": a},
+    delays are 0..d_max or pruned delay domains of presolve (trains_timing["domains"])
     """
     S = trains_routes["Routes"]
     T_stop = trains_timing["tau"]["t_stop"]
-    inds = []
-    for j in trains_routes["T"]:
-        for s in S[j]:
-            for d in range(d_max + 1):
-                a_value = T_stop.get(j+'_'+s, 0)
-                inds.append({"t": j, "s": s, "d": d, "a": a_value})
+    keys = [(j, s) for j in trains_routes["T"] for s in S[j]]
+    delays = delayDomains(keys, trains_timing.get("domains"), d_max)
+    sizes = [len(ds) for ds in delays]
+    inds, train_id, station_id = newIndex(trains_routes, sum(sizes))
+    records = inds.records
+    records["kind"] = X_VARIABLE
+    records["t"] = np.repeat([train_id[j] for j, _ in keys], sizes)
+    records["s"] = np.repeat([station_id[s] for _, s in keys], sizes)
+    records["d"] = np.concatenate(delays) if delays else []
+    records["a"] = np.repeat([T_stop.get(j+'_'+s, 0) for j, s in keys], sizes)
     return inds, len(inds)
 
+def delayDomains(keys, domains, d_max):
+    """
+    Function to return list of possible delays of each (train, station) key, all delays 0..d_max if domains are not given
+    """
+    if not domains:
+        return [list(range(d_max + 1)) for _ in keys]
+    return [list(domains.get(key, range(d_max + 1))) for key in keys]
+
+def quboIndices(Problem):
+    """
+    Function to return indices of qubits and auxiliary variables of the problem (inds, q_bits, inds_z, q_bits_z)
+    """
+    inds, q_bits = indexingForQubo(Problem.trains_routes, Problem.trains_timing, Problem.d_max)
+    inds_z, q_bits_z = zIndices(Problem.trains_routes, Problem.trains_timing, Problem.d_max, Problem.trains_timing.get("domains"))
+    return inds, q_bits, inds_z, q_bits_z
+
 def pSum(k, l, tsd_dicts):
     """
     Function for sum to one conditon
@@ -42,17 +69,15 @@ def pHeadway(k, l, tsd_dicts, trains_timing, trains_routes):
     s_next = subsequentStation(S[t], s)
 
     if s == s1 and s_next and s_next == subsequentStation(S[t1], s1):
-        if s in trains_routes["T1"].keys():
-            if s_next in trains_routes["T1"][s].keys():
-                if occursAsPair(t, t1, trains_routes["T1"][s][s_next]):
-                    time = tsd_dicts[k]["d"] + edt(S, trains_timing, t, s)
-                    time1 = tsd_dicts[l]["d"] + edt(S, trains_timing, t1, s)
+        if indexedPair(trains_routes, "T1", (s, s_next), t, t1):
+            time = tsd_dicts[k]["d"] + edt(S, trains_timing, t, s)
+            time1 = tsd_dicts[l]["d"] + edt(S, trains_timing, t1, s)
 
-                    A = -tau(trains_timing, "t_headway", first_train=t1, second_train=t, first_station=s, second_station=s_next)
-                    B = tau(trains_timing, "t_headway", first_train=t, second_train=t1, first_station=s, second_station=s_next)
+            A = -tau(trains_timing, "t_headway", first_train=t1, second_train=t, first_station=s, second_station=s_next)
+            B = tau(trains_timing, "t_headway", first_train=t, second_train=t1, first_station=s, second_station=s_next)
 
-                    if A < time1 - time < B:
-                        return 1.0
+            if A < time1 - time < B:
+                return 1.0
     return 0.0
 
 def pSingleTrack(k, l, jsd_dicts, trains_timing, trains_routes):
@@ -73,7 +98,7 @@ def penaltySingleTrack(k, l, tsd_dicts, trains_timing, trains_routes):
     s = tsd_dicts[k]["s"]
     s1 = tsd_dicts[l]["s"]
 
-    if (s, s1) in trains_routes["T0"].keys() and [t, t1] in trains_routes["T0"][(s, s1)]:
+    if indexedPair(trains_routes, "T0", (s, s1), t, t1):
         time = tsd_dicts[k]["d"] + edt(S, trains_timing, t, s)
         time2 = time
         time1 = tsd_dicts[l]["d"] + edt(S, trains_timing, t1, s1)
@@ -124,20 +149,18 @@ def pSwitchOccupation(k, l, inds, trains_timing, trains_routes):
     sp = inds[k]["s"]
     spp = inds[l]["s"]
 
-    for s in trains_routes["Tswitch"].keys():
-        for pairs_of_switch in trains_routes["Tswitch"][s]:
-            if [tp, tpp] == list(pairs_of_switch.keys()) or [tpp, tp] == list(pairs_of_switch.keys()): 
-                if sp == departureStationForSwitches(s, tp, pairs_of_switch, trains_routes):
-                    if spp == departureStationForSwitches(s, tpp, pairs_of_switch, trains_routes):
-                        t = inds[k]["d"] + edt(S, trains_timing, tp, sp)
-                        if s != sp:
-                            t += tau(trains_timing, "t_pass", first_train=tp, first_station=sp, second_station=s)
-                        t1 = inds[l]["d"] + edt(S, trains_timing, tpp, spp)
-                        if s != spp:
-                            t1 += tau(trains_timing, "t_pass", first_train=tpp, first_station=spp, second_station=s)
-                        p = penaltySwitch(t, t1, trains_timing)
-                        if p > 0:
-                            return p
+    for s, pairs_of_switch in switchesOfPair(trains_routes, tp, tpp):
+        if sp == departureStationForSwitches(s, tp, pairs_of_switch, trains_routes):
+            if spp == departureStationForSwitches(s, tpp, pairs_of_switch, trains_routes):
+                t = inds[k]["d"] + edt(S, trains_timing, tp, sp)
+                if s != sp:
+                    t += tau(trains_timing, "t_pass", first_train=tp, first_station=sp, second_station=s)
+                t1 = inds[l]["d"] + edt(S, trains_timing, tpp, spp)
+                if s != spp:
+                    t1 += tau(trains_timing, "t_pass", first_train=tpp, first_station=spp, second_station=s)
+                p = penaltySwitch(t, t1, trains_timing)
+                if p > 0:
+                    return p
     return 0.0
 
 def penaltySwitch(t, t1, trains_timing):
@@ -150,32 +173,95 @@ def penaltySwitch(t, t1, trains_timing):
 
 ##### track occupancy condition   - QUBO creation ####
 
-def zIndices(trains_routes, d_max):
+def zIndices(trains_routes, trains_timing, d_max, domains=None):
     """
     Auxiliary indexing for decomposition of qubic term,
     for track occupation condition
 
-    Returns vector of dicts of 2 trains(j, j1) at delays(d, d1) at stations (s)
+    Returns index (QuboIndex) of 2 trains(t, t1) at delays(d, d1) at stations (s),
+    only delays in pruned delay domains are used if domains are given.
+    Only auxiliary variables of non zero qubic terms are created (firingAuxiliaries),
+    quboIndices(Problem) returns them together with the qubits in the layout of makeQubo
 
-    {"j": j, "j1": j1, "s": s, "d": d, "d1": d1}
+    {"t": t, "t1": t1, "s": s, "d": d, "d1": d1}
     """
-    jsd_dicts = []
+    keys = zKeys(trains_routes)
+    return zIndexOfDelays(trains_routes, keys, zDelays(trains_routes, trains_timing, keys, d_max, domains))
+
+def zKeys(trains_routes):
+    """
+    Function to return (train, train1, station) keys of auxiliary variables in the order of zIndices
+    """
+    keys = []
     for s in trains_routes["Ttrack"].keys():
         for js in trains_routes["Ttrack"][s]:
             for (j, j1) in itertools.combinations(js, 2):
-                for d in range(d_max + 1):
-                    for d1 in range(d_max + 1):
-                        jsd_dicts.append({"t": j, "t1": j1, "s": s, "d": d, "d1": d1})
+                keys.append((j, j1, s))
+    return keys
+
+def zDelays(trains_routes, trains_timing, keys, d_max, domains=None):
+    """
+    Function to return delays (d, d1) of auxiliary variables of each (train, train1, station) key (arrays),
+    only delays of non zero qubic terms (firingAuxiliaries)
+    """
+    delays = delayDomains([(j, s) for j, _, s in keys], domains, d_max)
+    delays1 = delayDomains([(j1, s) for _, j1, s in keys], domains, d_max)
+    grids = []
+    for (j, j1, s), ds, ds1 in zip(keys, delays, delays1):
+        d, d1 = (grid.ravel() for grid in np.meshgrid(ds, ds1, indexing="ij"))
+        fired = firingAuxiliaries(trains_routes, trains_timing, j, j1, s, d, d1, domains, d_max)
+        grids.append((d[fired], d1[fired]))
+    return grids
+
+def zIndexOfDelays(trains_routes, keys, grids):
+    """
+    Function to return index (QuboIndex) of auxiliary variables of keys with delays grids (as zDelays) and its length
+    """
+    sizes = [len(d) for d, _ in grids]
+    jsd_dicts, train_id, station_id = newIndex(trains_routes, sum(sizes))
+    records = jsd_dicts.records
+    records["kind"] = Z_VARIABLE
+    records["t"] = np.repeat([train_id[j] for j, _, _ in keys], sizes).astype(np.int32)
+    records["t1"] = np.repeat([train_id[j1] for _, j1, _ in keys], sizes).astype(np.int32)
+    records["s"] = np.repeat([station_id[s] for _, _, s in keys], sizes).astype(np.int32)
+    records["d"] = np.concatenate([d for d, _ in grids] or [[]])
+    records["d1"] = np.concatenate([d1 for _, d1 in grids] or [[]])
     return jsd_dicts, len(jsd_dicts)
 
+def firingAuxiliaries(trains_routes, trains_timing, t, t1, s, d, d1, domains, d_max):
+    """
+    Function to return boolean array of auxiliary variables of trains t, t1 at station s with delays d, d1 (arrays)
+    which take part in some non zero qubic term of track occupation condition (pairOneTrackConstrains).
+    The term is non zero if one of the trains, leaving the preceeding station with its smallest possible delay,
+    enters the station after the other train and before it leaves
+    """
+    S = trains_routes["Routes"]
+    time = d + edt(S, trains_timing, t, s)
+    time1 = d1 + edt(S, trains_timing, t1, s)
+    fired = np.zeros(len(d), dtype=bool)
+    for tx, ty, own, other in ((t, t1, time, time1), (t1, t, time1, time)):
+        sx = previousStation(S[tx], s)
+        if sx is None or not indexedPair(trains_routes, "Ttrack", s, tx, ty):
+            continue
+        delays = delayDomains([(tx, sx)], domains, d_max)[0]
+        if len(delays) == 0:
+            continue
+        arrival = min(delays) + edt(S, trains_timing, tx, sx)
+        arrival += tau(trains_timing, "t_pass", first_train=tx, first_station=sx, second_station=s)
+        fired |= (arrival < other) & (other <= own)
+    return fired
+
 def pTrackOccupationConditionQuadraticPart(k, l, jsd_dicts, trains_timing, trains_routes):
     """
     Function for quadratic part of track occupation condition
     """
-    if len(jsd_dicts[k].keys()) == 3 and len(jsd_dicts[l].keys()) == 5:
+    kind = jsd_dicts[k].kind
+    kind1 = jsd_dicts[l].kind
+
+    if kind == X_VARIABLE and kind1 == Z_VARIABLE:
         return pairOneTrackConstrains(jsd_dicts, k, l, trains_timing, trains_routes)
 
-    if len(jsd_dicts[k].keys()) == 5 and len(jsd_dicts[l].keys()) == 3:
+    if kind == Z_VARIABLE and kind1 == X_VARIABLE:
         return pairOneTrackConstrains(jsd_dicts, l, k, trains_timing, trains_routes)
 
     return 0.0
@@ -196,14 +282,14 @@ def pairOneTrackConstrains(jsd_dicts, k, l, trains_timing, trains_routes):
         tz = jsd_dicts[l]["t"]
         tz1 = jsd_dicts[l]["t1"]
 
-        if (tx == tz) and occursAsPair(tx, tz1, trains_routes["Ttrack"][sz]):
+        if (tx == tz) and indexedPair(trains_routes, "Ttrack", sz, tx, tz1):
                 # tz, tz1, tx => t', t, t''
                 # sx, sz -> s', s
                 p = oneTrackConstrains(tx, tz, tz1, sx, sz, d, d1, d2, trains_timing, trains_routes)
                 if p > 0:
                     return p
 
-        if (tx == tz1) and occursAsPair(tx, tz, trains_routes["Ttrack"][sz]):
+        if (tx == tz1) and indexedPair(trains_routes, "Ttrack", sz, tx, tz):
                 # tz1, tz, tx => t', t,  t''
                 # sx, sz -> s', s
                 p = oneTrackConstrains(tx, tz1, tz, sx, sz, d, d2, d1, trains_timing, trains_routes)
@@ -232,13 +318,14 @@ def pRosenbergDecomposition(k, l, jsd_dicts, trains_routes):
     Returns not weighted contribution to Qmat[k,l]=Qmat[l, k].
     Coificnets at k  ≠ l are divided by 2 because they are taken twice
     """
-    S = trains_routes["Routes"]
+    kind = jsd_dicts[k].kind
+    kind1 = jsd_dicts[l].kind
 
-    if len(jsd_dicts[k].keys()) == len(jsd_dicts[l].keys()) == 5:
+    if kind == kind1 == Z_VARIABLE:
         if k == l:
             return 3.0
 
-    if len(jsd_dicts[k].keys()) == 3 and len(jsd_dicts[l].keys()) == 5:
+    if kind == X_VARIABLE and kind1 == Z_VARIABLE:
         tx = jsd_dicts[k]["t"]
         sx = jsd_dicts[k]["s"]
         sz = jsd_dicts[l]["s"]
@@ -255,7 +342,7 @@ def pRosenbergDecomposition(k, l, jsd_dicts, trains_routes):
                     return -1.0
 
     # -1. 0 because it is taken twice due to the symmetrisation
-    if len(jsd_dicts[k].keys()) == 5 and len(jsd_dicts[l].keys()) == 3:
+    if kind == Z_VARIABLE and kind1 == X_VARIABLE:
         tx = jsd_dicts[l]["t"]
         sx = jsd_dicts[l]["s"]
         sz = jsd_dicts[k]["s"]
@@ -269,14 +356,16 @@ def pRosenbergDecomposition(k, l, jsd_dicts, trains_routes):
                 if jsd_dicts[l]["d"] == jsd_dicts[k]["d1"]:
                     return -1.0
 
-    if len(jsd_dicts[k].keys()) == 3 and len(jsd_dicts[l].keys()) == 3:
+    # x x part of the penalty exists only together with auxiliary variable of the pair
+    if kind == kind1 == X_VARIABLE:
         s = jsd_dicts[k]["s"]
         if s == jsd_dicts[l]["s"]:
             j = jsd_dicts[k]["t"]
             j1 = jsd_dicts[l]["t"]
-            sz = subsequentStation(S[j], s)
-            if s in trains_routes["Ttrack"].keys():
-                if occursAsPair(j, j1, trains_routes["Ttrack"][s]):
+            d = jsd_dicts[k]["d"]
+            d1 = jsd_dicts[l]["d"]
+            if indexedPair(trains_routes, "Ttrack", s, j, j1):
+                if jsd_dicts.hasAuxiliary(j, j1, s, d, d1) or jsd_dicts.hasAuxiliary(j1, j, s, d1, d):
                     return 0.5
     return 0.0
 
@@ -310,30 +399,405 @@ def getZCoupling(k, l, tsd_dicts, Problem):
     """ 
     Function to return weighted hard constrains contributions to Qmat at k,l in the case where auxiliary variables are included
     """
-    trains_timing = Problem.trains_timing
-    trains_routes = Problem.trains_routes
-    T = Problem.p_pair * pTrackOccupationConditionQuadraticPart(k, l, tsd_dicts, trains_timing, trains_routes)
-    T += Problem.p_qubic * pRosenbergDecomposition(k, l, tsd_dicts, trains_routes)
+    T = getTrackOccupationCoupling(k, l, tsd_dicts, Problem)
+    T += getRosenbergCoupling(k, l, tsd_dicts, Problem)
     return T
 
-def makeQubo(Problem):
+def getTrackOccupationCoupling(k, l, tsd_dicts, Problem):
     """
-    Function to encode problem to QUBO matrix
+    Function to return weighted quadratic part of track occupation condition at k,l
     """
-    inds, q_bits = indexingForQubo(Problem.trains_routes, Problem.trains_timing, Problem.d_max) 
-    inds_z, q_bits_z = zIndices(Problem.trains_routes, Problem.d_max)
-    inds1 = np.concatenate([inds, inds_z])
-    Q = [[0.0 for _ in range(q_bits + q_bits_z)] for _ in range(q_bits + q_bits_z)]
+    return Problem.p_pair * pTrackOccupationConditionQuadraticPart(k, l, tsd_dicts, Problem.trains_timing, Problem.trains_routes)
+
+def getRosenbergCoupling(k, l, tsd_dicts, Problem):
+    """
+    Function to return weighted Rosenberg decomposition contribution at k,l
+    """
+    return Problem.p_qubic * pRosenbergDecomposition(k, l, tsd_dicts, Problem.trains_routes)
+
+#### sparse QUBO assembly ####
+
+def groupIndices(inds):
+    """
+    Function to group qubit indices by (train, station) {(t, s): [k, ...]}
+    """
+    groups = {}
+    for k, key in enumerate(zip(inds.trainNames(), inds.stationNames())):
+        groups.setdefault(key, []).append(k)
+    return groups
+
+def zGroupIndices(inds_z, offset):
+    """
+    Function to group auxiliary variables by (train, train1, station) {(t, t1, s): [m, ...]}, offset is the number of qubits before them
+    """
+    groups = {}
+    records = inds_z.records
+    if len(records) == 0:
+        return groups
+    # variables of one key are contiguous, so the index is split to runs of the same (t, t1, s)
+    change = (records["t"][1:] != records["t"][:-1]) | (records["t1"][1:] != records["t1"][:-1]) | (records["s"][1:] != records["s"][:-1])
+    bounds = np.concatenate([[0], np.flatnonzero(change) + 1, [len(records)]])
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        key = (inds_z.trains[records["t"][start]], inds_z.trains[records["t1"][start]], inds_z.stations[records["s"][start]])
+        groups.setdefault(key, []).extend(range(start + offset, stop + offset))
+    return groups
+
+def zGroupsOfTrains(z_groups, trains):
+    """
+    Function to return groups of auxiliary variables where at least one train is in trains (all groups if trains is None)
+    """
+    if trains is None:
+        return z_groups
+    return {key: ms for key, ms in z_groups.items() if key[0] in trains or key[1] in trains}
+
+def trainsOf(trains_routes, trains=None):
+    """
+    Function to return trains of the problem, only those in trains if they are given
+    """
+    if trains is None:
+        return trains_routes["T"]
+    return [t for t in trains_routes["T"] if t in trains]
+
+def ofTrains(trains, *ts):
+    """
+    Function checks whether some of trains ts is in trains (always True if trains is None)
+    """
+    return trains is None or any(t in trains for t in ts)
+
+def sumPairs(trains_routes, trains=None):
+    """
+    Function to return (train, station) pairs coupled by sum to one condition
+    """
+    pairs = set()
+    for t in trainsOf(trains_routes, trains):
+        for s in trains_routes["Routes"][t]:
+            pairs.add(((t, s), (t, s)))
+    return pairs
+
+def headwayPairs(trains_routes, trains=None):
+    """
+    Function to return (train, station) pairs coupled by minimal headway condition
+    """
+    pairs = set()
+    for s in trains_routes["T1"].keys():
+        for all_ts in trains_routes["T1"][s].values():
+            for ts in all_ts:
+                if not ofTrains(trains, *ts):
+                    continue
+                for (t, t1) in itertools.permutations(ts, 2):
+                    if ofTrains(trains, t, t1):
+                        pairs.add(((t, s), (t1, s)))
+    return pairs
+
+def minimalStayPairs(trains_routes, trains=None):
+    """
+    Function to return (train, station) pairs coupled by minimal stay condition
+    """
+    pairs = set()
+    for t in trainsOf(trains_routes, trains):
+        route = trains_routes["Routes"][t]
+        for sp, s in zip(route, route[1:]):
+            pairs.add(((t, sp), (t, s)))
+            pairs.add(((t, s), (t, sp)))
+    return pairs
+
+def singleTrackPairs(trains_routes, trains=None):
+    """
+    Function to return (train, station) pairs coupled by single track line condition
+    """
+    pairs = set()
+    for (s, s1) in trains_routes["T0"].keys():
+        for (t, t1) in trains_routes["T0"][(s, s1)]:
+            if not ofTrains(trains, t, t1):
+                continue
+            pairs.add(((t, s), (t1, s1)))
+            pairs.add(((t1, s1), (t, s)))
+    return pairs
+
+def switchPairs(trains_routes, trains=None):
+    """
+    Function to return (train, station) pairs coupled by switch occupancy condition
+    """
+    pairs = set()
+    for s in trains_routes["Tswitch"].keys():
+        for pairs_of_switch in trains_routes["Tswitch"][s]:
+            if len(pairs_of_switch) != 2:
+                continue
+            tp, tpp = pairs_of_switch.keys()
+            if not ofTrains(trains, tp, tpp):
+                continue
+            sp = departureStationForSwitches(s, tp, pairs_of_switch, trains_routes)
+            spp = departureStationForSwitches(s, tpp, pairs_of_switch, trains_routes)
+            if sp is None or spp is None:
+                continue
+            pairs.add(((tp, sp), (tpp, spp)))
+            pairs.add(((tpp, spp), (tp, sp)))
+    return pairs
+
+def trackPairs(trains_routes, trains=None):
+    """
+    Function to return (train, station) pairs coupled by quadratic part of Rosenberg decomposition
+    """
+    pairs = set()
+    for s in trains_routes["Ttrack"].keys():
+        for js in trains_routes["Ttrack"][s]:
+            if not ofTrains(trains, *js):
+                continue
+            for (j, j1) in itertools.permutations(js, 2):
+                if ofTrains(trains, j, j1):
+                    pairs.add(((j, s), (j1, s)))
+    return pairs
+
+def familyPairs(trains_routes, trains=None):
+    """
+    Function to return candidate (train, station) pairs of each condition,
+    if trains are given, only pairs where at least one train is in trains
+    """
+    return {
+        "sum": sumPairs(trains_routes, trains),
+        "headway": headwayPairs(trains_routes, trains),
+        "minimal_stay": minimalStayPairs(trains_routes, trains),
+        "single_track": singleTrackPairs(trains_routes, trains),
+        "switch": switchPairs(trains_routes, trains),
+        "track": trackPairs(trains_routes, trains),
+    }
+
+def couplingPairs(trains_routes, trains=None):
+    """
+    Function to return all (train, station) pairs which may have non zero coupling in QUBO
+    (only pairs of trains if they are given)
+    """
+    pairs = set()
+    for family in familyPairs(trains_routes, trains).values():
+        pairs.update(family)
+    return pairs
+
+def zCouplingIndices(m, inds1, groups, trains_routes):
+    """
+    Function to return indices of qubits which may be coupled with auxiliary variable m
+    """
+    S = trains_routes["Routes"]
+    s = inds1[m]["s"]
+    keys = []
+    for t in (inds1[m]["t"], inds1[m]["t1"]):
+        keys.append((t, s))
+        keys.append((t, previousStation(S[t], s)))
+    return sorted({k for key in keys for k in groups.get(key, [])})
+
+def addEntry(entries, k, l, value):
+    """
+    Function to add value to sparse QUBO entries at k,l
+    """
+    if value != 0:
+        entries[(k, l)] = entries.get((k, l), 0.0) + value
+
+def entriesToArrays(entries):
+    """
+    Function to convert dict of QUBO entries {(k, l): value} to arrays (rows, cols, data)
+    """
+    rows = np.fromiter((k for (k, _) in entries.keys()), dtype=np.int64, count=len(entries))
+    cols = np.fromiter((l for (_, l) in entries.keys()), dtype=np.int64, count=len(entries))
+    data = np.fromiter(entries.values(), dtype=np.float64, count=len(entries))
+    return rows, cols, data
+
+def entriesToMatrix(entries, size, rows=(), cols=(), data=()):
+    """
+    Function to convert dict of QUBO entries {(k, l): value} and arrays of (rows, cols, data) to sparse CSR matrix,
+    repeated entries are summed up
+    """
+    entries_rows, entries_cols, entries_data = entriesToArrays(entries)
+    rows = np.concatenate([entries_rows, rows])
+    cols = np.concatenate([entries_cols, cols])
+    data = np.concatenate([entries_data, data])
+    Q = sp.coo_matrix((data, (rows.astype(np.int64), cols.astype(np.int64))), shape=(size, size)).tocsr()
+    Q.eliminate_zeros()
+    return Q
+
+def scalarEntries(Problem, vectorized, start, stop, trains=None, indices=None):
+    """
+    Function to return QUBO entries in rows start <= k < stop evaluated pair by pair (getCoupling, getZCoupling)
+    as arrays (rows, cols, data).
+    With vectorized=True only the objective (not covered by vectorizedCouplings) is evaluated.
+    If trains are given, only entries of qubits of these trains are evaluated,
+    indices (as quboIndices) are computed if they are not given
+    """
+    inds, q_bits, inds_z, q_bits_z = quboIndices(Problem) if indices is None else indices
+    entries = {}
 
     #add objective
-    for k in range(q_bits):
-        Q[k][k] += penalty(k, inds, Problem)
+    rows = np.arange(start, min(stop, q_bits))
+    if trains is not None:
+        rows = rows[np.isin(inds.trainNames()[rows], list(trains))]
+    for k in rows.tolist():
+        addEntry(entries, k, k, penalty(k, inds, Problem))
+    if vectorized:
+        return entriesToArrays(entries)
+    inds1 = concatenateIndices(inds, inds_z)
+    groups = groupIndices(inds)
     #quadratic headway, minimal stay, single_line, circulation, switch conditions
-    for k in range(q_bits):
-        for l in range(q_bits):
-            Q[k][l] += getCoupling(k, l, inds, Problem)
+    for key, key1 in couplingPairs(Problem.trains_routes, trains):
+        for k in groups.get(key, []):
+            if start <= k < stop:
+                for l in groups.get(key1, []):
+                    addEntry(entries, k, l, getCoupling(k, l, inds, Problem))
+                    addEntry(entries, k, l, getZCoupling(k, l, inds1, Problem))
     #qubic track occupancy condition
-    for k in range(q_bits + q_bits_z):
-        for l in range(q_bits + q_bits_z):
-            Q[k][l] += getZCoupling(k, l, inds1, Problem)
-    return Q
\ No newline at end of file
+    for m in range(q_bits, q_bits + q_bits_z):
+        if trains is not None and inds1[m]["t"] not in trains and inds1[m]["t1"] not in trains:
+            continue
+        for k in zCouplingIndices(m, inds1, groups, Problem.trains_routes):
+            if start <= k < stop:
+                addEntry(entries, k, m, getZCoupling(k, m, inds1, Problem))
+            if start <= m < stop:
+                addEntry(entries, m, k, getZCoupling(m, k, inds1, Problem))
+        if start <= m < stop:
+            addEntry(entries, m, m, getZCoupling(m, m, inds1, Problem))
+    return entriesToArrays(entries)
+
+def quboEntries(Problem, vectorized=True, workers=1, trains=None, indices=None):
+    """
+    Function to return QUBO entries as arrays (rows, cols, data) and size of the matrix,
+    if trains are given, only entries of qubits of these trains are evaluated,
+    indices (as quboIndices) are computed if they are not given
+    """
+    if indices is None:
+        indices = quboIndices(Problem)
+    inds, q_bits, inds_z, q_bits_z = indices
+    size = q_bits + q_bits_z
+    parts = []
+
+    if vectorized:
+        family_pairs = {name: sorted(pairs) for name, pairs in familyPairs(Problem.trains_routes, trains).items()}
+        z_groups = zGroupsOfTrains(zGroupIndices(inds_z, q_bits), trains)
+        if workers > 1:
+            # every candidate pair and auxiliary group goes to exactly one shard, so parts sum up to the whole matrix
+            z_items = list(z_groups.items())
+            shards = [{name: pairs[i::workers] for name, pairs in family_pairs.items()} for i in range(workers)]
+            z_shards = [dict(z_items[i::workers]) for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parts.extend(executor.map(partial(vectorizedCouplings, Problem, inds, groupIndices(inds)), shards, itertools.repeat(inds_z), z_shards))
+        else:
+            parts.append(vectorizedCouplings(Problem, inds, groupIndices(inds), family_pairs, inds_z, z_groups))
+        parts.append(scalarEntries(Problem, vectorized, 0, size, trains, indices))
+    elif workers > 1:
+        bounds = np.linspace(0, size, workers + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts.extend(executor.map(partial(scalarEntries, trains=trains, indices=indices), itertools.repeat(Problem), itertools.repeat(vectorized), bounds[:-1], bounds[1:]))
+    else:
+        parts.append(scalarEntries(Problem, vectorized, 0, size, trains, indices))
+
+    rows, cols, data = (np.concatenate(column) for column in zip(*parts))
+    return (rows, cols, data), size
+
+def makeQubo(Problem, vectorized=True, workers=1):
+    """
+    Function to encode problem to sparse QUBO matrix (scipy.sparse CSR)
+
+    Only pairs of qubits which can be coupled by some condition are evaluated,
+    so the cost scales with the number of non zero couplings.
+    With vectorized=True the pair conditions are evaluated in NumPy blocks (same coefficients as getCoupling and getZCoupling).
+    With workers > 1 the candidate pairs of every condition are split to shards evaluated in a process pool
+    (row blocks with vectorized=False), parts are merged in order, so the result does not depend on the number of workers
+    """
+    entries, size = quboEntries(Problem, vectorized, workers)
+    return entriesToMatrix({}, size, *entries)
+
+#### incremental QUBO update ####
+
+def sameStructure(old_problem, new_problem):
+    """
+    Function to check if two problems have the same routes, train sets and parameters, so they have the same qubits;
+    auxiliary variables may differ for trains with changed timings (they are created only for firing qubic terms)
+    """
+    parameters = ("p_sum", "p_pair", "p_qubic", "d_max")
+    if any(getattr(old_problem, p) != getattr(new_problem, p) for p in parameters):
+        return False
+    if old_problem.trains_timing.get("domains") != new_problem.trains_timing.get("domains"):
+        return False
+    return old_problem.trains_routes == new_problem.trains_routes
+
+def changedTrains(old_problem, new_problem):
+    """
+    Function to return set of trains which timings differ between two versions of the problem,
+    None if problems have different structure and QUBO has to be built from scratch
+    """
+    if not sameStructure(old_problem, new_problem):
+        return None
+    old = old_problem.compiled
+    new = new_problem.compiled
+    changed = np.zeros(len(new["trains"]), dtype=bool)
+    for key in ("t_pass", "t_stop", "t_out", "edt"):
+        changed |= ~np.all((old[key] == new[key]) | (np.isnan(old[key]) & np.isnan(new[key])), axis=1)
+    same_headway = (old["t_headway"] == new["t_headway"]) | (np.isnan(old["t_headway"]) & np.isnan(new["t_headway"]))
+    changed |= ~np.all(same_headway, axis=(1, 2)) | ~np.all(same_headway, axis=(0, 2))
+    return {t for t, c in zip(new["trains"], changed) if c}
+
+def updateQubo(old_problem, Problem, Q, trains=None, vectorized=True, workers=1):
+    """
+    Function to update QUBO matrix Q of the previous version of the problem (old_problem) to the new Problem,
+    only rows and columns of qubits of changed trains (changedTrains if not given) are recomputed.
+    Auxiliary variables of pairs of trains with a changed train are created again for the new timings,
+    the others are moved to their place in the new layout. Problems of different structure are encoded from scratch.
+    Problem may be built from an edited copy of old_problem.trains_timing, derived data of the copy is recomputed.
+    Works with full (makeQubo) and upper triangular (stored) matrices
+    """
+    Q = sp.coo_matrix(Q)
+    upper = sp.tril(Q, k=-1).nnz == 0
+    if trains is None:
+        trains = changedTrains(old_problem, Problem)
+    if trains is None:
+        R = makeQubo(Problem, vectorized, workers)
+        return upperTriangular(R) if upper else R
+    trains = set(trains)
+
+    # new layout, old layout differs only in auxiliary variables of keys with changed train
+    inds, q_bits = indexingForQubo(Problem.trains_routes, Problem.trains_timing, Problem.d_max)
+    keys = zKeys(Problem.trains_routes)
+    domains = Problem.trains_timing.get("domains")
+    grids = zDelays(Problem.trains_routes, Problem.trains_timing, keys, Problem.d_max, domains)
+    inds_z, q_bits_z = zIndexOfDelays(Problem.trains_routes, keys, grids)
+    changed = np.array([j in trains or j1 in trains for j, j1, _ in keys], dtype=bool)
+    sizes = np.array([len(d) for d, _ in grids], dtype=np.int64)
+    old_sizes = sizes.copy()
+    old_keys = [key for key, c in zip(keys, changed) if c]
+    old_grids = zDelays(old_problem.trains_routes, old_problem.trains_timing, old_keys, old_problem.d_max, domains)
+    old_sizes[changed] = [len(d) for d, _ in old_grids]
+    if Q.shape[0] != q_bits + old_sizes.sum():
+        raise ValueError(f"QUBO matrix of size {Q.shape[0]} does not match the previous problem ({q_bits + old_sizes.sum()} variables)")
+
+    # position of every old variable in the new layout, -1 for recomputed variables
+    affected_x = np.isin(inds.trainNames(), list(trains))
+    kept = np.repeat(~changed, old_sizes)
+    old_offsets = np.repeat(np.cumsum(old_sizes) - old_sizes, old_sizes)
+    new_offsets = np.repeat(np.cumsum(sizes) - sizes, old_sizes)
+    position = q_bits + new_offsets + np.arange(old_sizes.sum()) - old_offsets
+    mapping = np.concatenate([np.where(affected_x, -1, np.arange(q_bits)), np.where(kept, position, -1)])
+    keep = (mapping[Q.row] >= 0) & (mapping[Q.col] >= 0)
+
+    (rows, cols, data), size = quboEntries(Problem, vectorized, workers, trains, (inds, q_bits, inds_z, q_bits_z))
+    R = entriesToMatrix({}, size, rows, cols, data)
+    if upper:
+        R = upperTriangular(R)
+    R = R.tocoo()
+    return entriesToMatrix({}, size, np.concatenate([mapping[Q.row[keep]], R.row]), np.concatenate([mapping[Q.col[keep]], R.col]), np.concatenate([Q.data[keep], R.data]))
+
+def quboFamilies(Problem):
+    """
+    Function to return QUBO matrix split by constraint families {name: sparse matrix}, matrices sum up to makeQubo(Problem)
+    """
+    inds, q_bits, inds_z, q_bits_z = quboIndices(Problem)
+    size = q_bits + q_bits_z
+    objective = {}
+    for k in range(q_bits):
+        addEntry(objective, k, k, penalty(k, inds, Problem))
+
+    families = vectorizedFamilies(Problem, inds, groupIndices(inds), familyPairs(Problem.trains_routes), inds_z, zGroupIndices(inds_z, q_bits))
+    matrices = {name: entriesToMatrix({}, size, *entries) for name, entries in families.items()}
+    matrices["objective"] = entriesToMatrix(objective, size)
+    return matrices
+
+def makeBqm(Problem, vectorized=True, workers=1):
+    """
+    Function to encode problem straight to dimod.BinaryQuadraticModel from the sparse couplings
+    """
+    return quboToBqm(makeQubo(Problem, vectorized=vectorized, workers=workers))
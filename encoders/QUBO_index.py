@@ -0,0 +1,126 @@
+"""
+Compact index of QUBO variables
+
+Variables are kept in NumPy structured array with explicit kind (X_VARIABLE - train t at station s with delay d,
+Z_VARIABLE - auxiliary variable of trains t, t1 at station s with delays d, d1) and integer ids of trains and stations,
+ids are the same as in compiled problem. Record k is returned as read only dict like view, so inds[k]["t"] is train name.
+"""
+import numpy as np
+from problems.compiled_problem import internNames
+
+X_VARIABLE = 0
+Z_VARIABLE = 1
+
+INDEX_DTYPE = np.dtype([
+    ("kind", np.int8),
+    ("t", np.int32),
+    ("t1", np.int32),
+    ("s", np.int32),
+    ("d", np.int16),
+    ("d1", np.int16),
+    ("a", np.int32),
+])
+
+class QuboRecord():
+    """
+    Dict like view of one variable of QUBO index
+    """
+    __slots__ = ("index", "k")
+
+    def __init__(self, index, k):
+        self.index = index
+        self.k = k
+
+    @property
+    def kind(self):
+        return int(self.index.records["kind"][self.k])
+
+    def __getitem__(self, field):
+        value = self.index.records[field][self.k]
+        if field in ("t", "t1"):
+            if value < 0:
+                raise KeyError(field)
+            return self.index.trains[value]
+        if field == "s":
+            return self.index.stations[value]
+        if field in ("d1", "a") and self.kind != (Z_VARIABLE if field == "d1" else X_VARIABLE):
+            raise KeyError(field)
+        return int(value)
+
+    def keys(self):
+        if self.kind == X_VARIABLE:
+            return ("t", "s", "d", "a")
+        return ("t", "t1", "s", "d", "d1")
+
+class QuboIndex():
+    """
+    Index of QUBO variables - structured array of records and names of trains and stations
+    """
+    __slots__ = ("records", "trains", "stations", "auxiliaries")
+
+    def __init__(self, records, trains, stations):
+        self.records = records
+        self.trains = trains
+        self.stations = stations
+        self.auxiliaries = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self.records)
+        if not 0 <= k < len(self.records):
+            raise IndexError(k)
+        return QuboRecord(self, k)
+
+    def __iter__(self):
+        return (QuboRecord(self, k) for k in range(len(self.records)))
+
+    def kinds(self):
+        """
+        Function to return array of kinds of variables
+        """
+        return self.records["kind"]
+
+    def trainNames(self, field="t"):
+        """
+        Function to return array of train names of all records (None for missing t1)
+        """
+        names = np.array(list(self.trains) + [None], dtype=object)
+        return names[self.records[field]]
+
+    def hasAuxiliary(self, t, t1, s, d, d1):
+        """
+        Function checks whether index has auxiliary variable of trains t, t1 at station s with delays d, d1
+        """
+        if self.auxiliaries is None:
+            z = self.records[self.records["kind"] == Z_VARIABLE]
+            train_id = {name: i for i, name in enumerate(self.trains)}
+            station_id = {name: i for i, name in enumerate(self.stations)}
+            keys = set(zip(z["t"].tolist(), z["t1"].tolist(), z["s"].tolist(), z["d"].tolist(), z["d1"].tolist()))
+            self.auxiliaries = (train_id, station_id, keys)
+        train_id, station_id, keys = self.auxiliaries
+        return (train_id.get(t), train_id.get(t1), station_id.get(s), d, d1) in keys
+
+    def stationNames(self):
+        """
+        Function to return array of station names of all records
+        """
+        return np.array(self.stations, dtype=object)[self.records["s"]]
+
+def newIndex(trains_routes, size):
+    """
+    Function to return empty index of given size with train and station ids of the problem
+    """
+    trains, stations, train_id, station_id = internNames(trains_routes)
+    records = np.zeros(size, dtype=INDEX_DTYPE)
+    records["t1"] = -1
+    records["d1"] = -1
+    return QuboIndex(records, trains, stations), train_id, station_id
+
+def concatenateIndices(*indices):
+    """
+    Function to join indices of the same problem (e.g. x and z variables) to one index
+    """
+    return QuboIndex(np.concatenate([index.records for index in indices]), indices[0].trains, indices[0].stations)
@@ -0,0 +1,62 @@
+"""
+Presolve of QUBO - pruning of delay domains before the matrix is built
+
+Delay d of train t at station s is dropped when for some other (train, station) every remaining delay
+is in conflict with it (pairwise headway, minimal stay, single track and switch conditions),
+so no assignment without penalty can use it. Pruning is repeated until no more delays are dropped (arc consistency).
+Auxiliary variables of dropped delays are dropped by zIndices as well.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from encoders.QUBO_encoder import indexingForQubo, groupIndices
+from encoders.QUBO_validator import ruleConflicts
+
+def conflictGraph(Problem, inds, groups):
+    """
+    Function to return symmetric boolean sparse matrix of pairs of qubits in conflict by pairwise conditions
+    """
+    C = sum(ruleConflicts(Problem, inds, groups).values())
+    return ((C + C.T) > 0).astype(np.int64)
+
+def arcConsistency(C, group_of, n_groups):
+    """
+    Function to return boolean array of qubits which are supported by every group they are in conflict with,
+    None if some group looses all its qubits (no assignment without penalty)
+    """
+    n = len(group_of)
+    G = sp.csr_matrix((np.ones(n, dtype=np.int64), (np.arange(n), group_of)), shape=(n, n_groups))
+    alive = np.ones(n, dtype=bool)
+    while True:
+        # number of conflicts of qubit k with alive qubits of group g
+        A = (C.multiply(alive.astype(np.int64)).tocsr() @ G).tocoo()
+        size = np.bincount(group_of[alive], minlength=n_groups)
+        unsupported = (A.data > 0) & (A.data >= size[A.col])
+        remove = np.unique(A.row[unsupported])
+        remove = remove[alive[remove]]
+        if len(remove) == 0:
+            break
+        alive[remove] = False
+    if np.any(np.bincount(group_of[alive], minlength=n_groups) == 0):
+        return None
+    return alive
+
+def presolveDomains(Problem):
+    """
+    Function to return pruned delay domains {(t, s): [d, ...]} of the problem,
+    None if nothing can be pruned or pruning shows that there is no assignment without penalty
+    """
+    inds, q_bits = indexingForQubo(Problem.trains_routes, {**Problem.trains_timing, "domains": None}, Problem.d_max)
+    groups = groupIndices(inds)
+    group_of = np.empty(q_bits, dtype=np.int64)
+    for g, ks in enumerate(groups.values()):
+        group_of[ks] = g
+
+    alive = arcConsistency(conflictGraph(Problem, inds, groups), group_of, len(groups))
+    if alive is None:
+        print("presolve: no assignment without penalty within d_max, delay domains are not pruned")
+        return None
+    if alive.all():
+        return None
+    delays = inds.records["d"]
+    return {key: [int(delays[k]) for k in ks if alive[k]] for key, ks in groups.items()}
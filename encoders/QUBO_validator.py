@@ -0,0 +1,146 @@
+"""
+Validator of samples - violations of timetable rules counted for a batch of samples
+
+Samples are decoded to delays of trains at stations (groups of indexingForQubo), then
+one hot sum, headway (T1), single track (T0), minimal stay, switch (Tswitch) and track occupation (Ttrack)
+rules are checked for all samples at once. Pairwise rules are checked as pairs of qubits in conflict
+(the same conditions as QUBO_vectorized), track occupation directly on decoded delays
+or as triples of qubits in conflict (used by the repair).
+"""
+import itertools
+
+import numpy as np
+import scipy.sparse as sp
+
+from encoders.QUBO_encoder import indexingForQubo, groupIndices, familyPairs
+from encoders.QUBO_vectorized import indexColumns, groupArrays, headwayCouplings, minimalStayCouplings, singleTrackCouplings, switchCouplings
+from helpers.helpers_functions_QUBO import previousStation, indexedPair, tau
+
+RULES = ("one_hot", "headway", "minimal_stay", "single_track", "switch", "track_occupation")
+
+def ruleConflicts(Problem, inds, groups):
+    """
+    Function to return pairs of qubits in conflict by pairwise rules {rule: upper triangular boolean sparse matrix}
+    """
+    trains_timing = Problem.trains_timing
+    trains_routes = Problem.trains_routes
+    columns = indexColumns(inds, Problem.compiled)
+    group_arrays = groupArrays(groups)
+    family_pairs = familyPairs(trains_routes)
+    parts = {
+        "headway": headwayCouplings(list(family_pairs["headway"]), columns, group_arrays, trains_timing, trains_routes),
+        "minimal_stay": minimalStayCouplings(list(family_pairs["minimal_stay"]), columns, group_arrays, trains_timing, trains_routes),
+        "single_track": singleTrackCouplings(list(family_pairs["single_track"]), columns, group_arrays, trains_timing, trains_routes),
+        "switch": switchCouplings(list(family_pairs["switch"]), columns, group_arrays, trains_timing, trains_routes),
+    }
+    n = len(inds)
+    conflicts = {}
+    for rule, (k, l, v) in parts.items():
+        fired = v > 0
+        rows, cols = np.minimum(k[fired], l[fired]), np.maximum(k[fired], l[fired])
+        C = sp.coo_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(n, n)).tocsr()
+        conflicts[rule] = (C > 0).astype(np.int64)
+    return conflicts
+
+def groupMatrix(groups, n):
+    """
+    Function to return sparse matrix (qubits x groups) of membership of qubits in groups
+    """
+    members = np.concatenate([np.asarray(ks, dtype=np.int64) for ks in groups.values()])
+    group_of = np.repeat(np.arange(len(groups)), [len(ks) for ks in groups.values()])
+    return sp.csr_matrix((np.ones(len(members), dtype=np.int64), (members, group_of)), shape=(n, len(groups)))
+
+def decodeDelays(X, inds, groups):
+    """
+    Function to decode samples (rows of X, x variables first) to delays of groups (samples x groups),
+    -1 where group has not exactly one qubit set; returns delays and numbers of qubits set in groups
+    """
+    X = np.asarray(X)[:, :len(inds)].astype(np.int64)
+    G = groupMatrix(groups, len(inds))
+    counts = np.asarray((G.T @ X.T).T)
+    delays = np.asarray((G.multiply(inds.records["d"].astype(np.int64)[:, None]).T @ X.T).T)
+    return np.where(counts == 1, delays, -1), counts
+
+def trackOccupationKeys(Problem, groups):
+    """
+    Function to yield groups of track occupation condition ((tx, sx), (tx, s), (ty, s)) - train tx leaving preceeding
+    station sx, the same train and the other train ty of the pair at station s - with passing time of tx from sx to s
+    """
+    trains_routes = Problem.trains_routes
+    S = trains_routes["Routes"]
+    for s in trains_routes["Ttrack"]:
+        for js in trains_routes["Ttrack"][s]:
+            for t, t1 in itertools.combinations(js, 2):
+                for tx, ty in ((t, t1), (t1, t)):
+                    sx = previousStation(S[tx], s)
+                    keys = ((tx, sx), (tx, s), (ty, s))
+                    if sx is None or not indexedPair(trains_routes, "Ttrack", s, tx, ty) or any(key not in groups for key in keys):
+                        continue
+                    yield keys, tau(Problem.trains_timing, "t_pass", first_train=tx, first_station=sx, second_station=s)
+
+def trackOccupationViolations(Problem, groups, delays):
+    """
+    Function to count violations of track occupation condition of decoded delays: train leaving preceeding station enters
+    the station after the other train of the pair and before it leaves (as in trackOccupationCouplings)
+    """
+    column = {key: g for g, key in enumerate(groups)}
+    violations = np.zeros(len(delays), dtype=np.int64)
+    for keys, t_pass in trackOccupationKeys(Problem, groups):
+        d_prev, d_own, d_other = (delays[:, column[key]] for key in keys)
+        valid = (d_prev >= 0) & (d_own >= 0) & (d_other >= 0)
+        time = d_prev + Problem.edt_table[keys[0]] + t_pass
+        own = d_own + Problem.edt_table[keys[1]]
+        other = d_other + Problem.edt_table[keys[2]]
+        violations += valid & (time < other) & (other <= own)
+    return violations
+
+def trackOccupationTriples(Problem, inds, groups):
+    """
+    Function to return triples of qubits (m x 3) violating track occupation condition when all three are set,
+    qubits are of groups (tx, sx), (tx, s) and (ty, s) of trackOccupationKeys
+    """
+    d = inds.records["d"].astype(np.int64)
+    triples = [np.zeros((0, 3), dtype=np.int64)]
+    for keys, t_pass in trackOccupationKeys(Problem, groups):
+        prev, own, other = (np.asarray(groups[key], dtype=np.int64) for key in keys)
+        time = d[prev] + Problem.edt_table[keys[0]] + t_pass
+        own_time = d[own] + Problem.edt_table[keys[1]]
+        other_time = d[other] + Problem.edt_table[keys[2]]
+        i, j, k = np.nonzero((time[:, None, None] < other_time[None, None, :]) & (other_time[None, None, :] <= own_time[None, :, None]))
+        triples.append(np.stack([prev[i], own[j], other[k]], axis=1))
+    return np.concatenate(triples)
+
+def validateSamples(Problem, X, inds=None, groups=None):
+    """
+    Function to count violations of every rule for each sample (rows of X) {rule: counts}
+    """
+    if inds is None:
+        inds, _ = indexingForQubo(Problem.trains_routes, Problem.trains_timing, Problem.d_max)
+    if groups is None:
+        groups = groupIndices(inds)
+    X = np.atleast_2d(np.asarray(X))
+    delays, counts = decodeDelays(X, inds, groups)
+    x = X[:, :len(inds)].astype(np.float64)
+
+    violations = {"one_hot": np.count_nonzero(counts != 1, axis=1)}
+    for rule, C in ruleConflicts(Problem, inds, groups).items():
+        violations[rule] = np.rint(np.einsum("ri,ri->r", x, np.asarray((C.T @ x.T).T))).astype(np.int64)
+    violations["track_occupation"] = trackOccupationViolations(Problem, groups, delays)
+    return violations
+
+def feasibleSamples(violations):
+    """
+    Function to return boolean array of samples without violations of any rule
+    """
+    return np.all([counts == 0 for counts in violations.values()], axis=0)
+
+def feasibility(Problem):
+    """
+    Function to return function selecting feasible samples of the problem (e.g. for load_train_solution)
+    """
+    inds, _ = indexingForQubo(Problem.trains_routes, Problem.trains_timing, Problem.d_max)
+    groups = groupIndices(inds)
+
+    def feasible(samples):
+        return feasibleSamples(validateSamples(Problem, samples, inds, groups))
+    return feasible
@@ -0,0 +1,259 @@
+"""
+Vectorized evaluation of QUBO pair conditions
+
+Conditions are evaluated with NumPy broadcasting over whole blocks of qubit pairs,
+structural checks (routes, T0, T1, Ttrack, Tswitch) are done once per pair of (train, station) groups.
+Gives the same coefficients as pSum, pHeadway, pMinimalStay, pSingleTrack, pSwitchOccupation,
+pTrackOccupationConditionQuadraticPart and pRosenbergDecomposition.
+"""
+import numpy as np
+from encoders.QUBO_index import concatenateIndices
+from helpers.helpers_functions_QUBO import subsequentStation, previousStation, indexedPair, switchesOfPair, tau, departureStationForSwitches
+
+def indexColumns(inds, compiled):
+    """
+    Function to turn QUBO index to columnar arrays of train id, station id, delay and earliest departure time,
+    for auxiliary variables also second delay d1 and earliest departure time edt1 of the second train t1,
+    ids of the index are the ids of compiled problem
+    """
+    t = inds.records["t"].astype(np.int64)
+    t1 = inds.records["t1"].astype(np.int64)
+    s = inds.records["s"].astype(np.int64)
+    d = inds.records["d"].astype(np.int64)
+    d1 = inds.records["d1"].astype(np.int64)
+    edt1 = np.where(t1 >= 0, compiled["edt"][np.maximum(t1, 0), s], np.nan)
+    return {"t": t, "s": s, "d": d, "edt": compiled["edt"][t, s], "d1": d1, "edt1": edt1}
+
+def groupArrays(groups):
+    """
+    Function to turn groups {(t, s): [k, ...]} to CSR like arrays
+
+    Returns dict of group number by key, pointers to members and members
+    """
+    group_of = {key: g for g, key in enumerate(groups.keys())}
+    sizes = np.array([len(ks) for ks in groups.values()], dtype=np.int64)
+    ptr = np.concatenate([[0], np.cumsum(sizes)])
+    members = np.fromiter((k for ks in groups.values() for k in ks), dtype=np.int64, count=int(ptr[-1]))
+    return group_of, ptr, members
+
+def expandPairs(key_pairs, group_arrays):
+    """
+    Function to expand pairs of (train, station) groups to all pairs of their qubits
+
+    Returns arrays of qubits k, l and p - position of the groups pair in key_pairs
+    """
+    group_of, ptr, members = group_arrays
+    valid = [i for i, (a, b) in enumerate(key_pairs) if a in group_of and b in group_of]
+    if not valid:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    ga = np.array([group_of[key_pairs[i][0]] for i in valid], dtype=np.int64)
+    gb = np.array([group_of[key_pairs[i][1]] for i in valid], dtype=np.int64)
+    na = ptr[ga + 1] - ptr[ga]
+    nb = ptr[gb + 1] - ptr[gb]
+    counts = na * nb
+    p = np.repeat(np.arange(len(valid)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    k = members[ptr[ga][p] + local // nb[p]]
+    l = members[ptr[gb][p] + local % nb[p]]
+    return k, l, np.array(valid, dtype=np.int64)[p]
+
+def sumCouplings(key_pairs, columns, group_arrays):
+    """
+    Vectorized sum to one condition
+    """
+    k, l, _ = expandPairs(key_pairs, group_arrays)
+    d = columns["d"]
+    return k, l, np.where(d[k] == d[l], -1.0, 1.0)
+
+def headwayCouplings(key_pairs, columns, group_arrays, trains_timing, trains_routes):
+    """
+    Vectorized minimal headway condition
+    """
+    S = trains_routes["Routes"]
+    pairs, A, B = [], [], []
+    for (t, s), (t1, s1) in key_pairs:
+        s_next = subsequentStation(S[t], s)
+        if s == s1 and s_next and s_next == subsequentStation(S[t1], s1):
+            if indexedPair(trains_routes, "T1", (s, s_next), t, t1):
+                pairs.append(((t, s), (t1, s1)))
+                A.append(-tau(trains_timing, "t_headway", first_train=t1, second_train=t, first_station=s, second_station=s_next))
+                B.append(tau(trains_timing, "t_headway", first_train=t, second_train=t1, first_station=s, second_station=s_next))
+
+    k, l, p = expandPairs(pairs, group_arrays)
+    d, e = columns["d"], columns["edt"]
+    time = d[k] + e[k]
+    time1 = d[l] + e[l]
+    A, B = np.array(A, dtype=float), np.array(B, dtype=float)
+    return k, l, ((A[p] < time1 - time) & (time1 - time < B[p])).astype(float)
+
+def minimalStayParameters(a, b, S, trains_timing):
+    """
+    Helper function to return (active, t_pass, t_stop) of minimal stay condition when train leaves station a to b
+    """
+    (t, sp), (t1, s) = a, b
+    if t == t1 and s == subsequentStation(S[t], sp):
+        t_pass = tau(trains_timing, "t_pass", first_train=t, first_station=sp, second_station=s)
+        t_stop = tau(trains_timing, "t_stop", first_train=t, first_station=s)
+        return True, t_pass, t_stop
+    return False, 0.0, 0.0
+
+def minimalStayCouplings(key_pairs, columns, group_arrays, trains_timing, trains_routes):
+    """
+    Vectorized minimal stay condition (both directions, as in pMinimalStay)
+    """
+    S = trains_routes["Routes"]
+    params = [minimalStayParameters(a, b, S, trains_timing) + minimalStayParameters(b, a, S, trains_timing) for a, b in key_pairs]
+    params = np.array(params, dtype=float).reshape(-1, 6)
+
+    k, l, p = expandPairs(key_pairs, group_arrays)
+    d, e = columns["d"], columns["edt"]
+    value = np.zeros(len(k))
+    for (first, second), (active, t_pass, t_stop) in (((k, l), params[:, 0:3].T), ((l, k), params[:, 3:6].T)):
+        lhs = d[second] + e[second]
+        rhs = d[first] + e[first] + t_pass[p] + t_stop[p]
+        value += (active[p] > 0) & (lhs < rhs)
+    return k, l, value
+
+def singleTrackParameters(a, b, trains_timing, trains_routes):
+    """
+    Helper function to return (active, t_pass backwards, t_pass forwards) of single track condition for groups a and b
+    """
+    (t, s), (t1, s1) = a, b
+    if indexedPair(trains_routes, "T0", (s, s1), t, t1):
+        back = tau(trains_timing, "t_pass", first_train=t1, first_station=s1, second_station=s)
+        forward = tau(trains_timing, "t_pass", first_train=t, first_station=s, second_station=s1)
+        return True, back, forward
+    return False, 0.0, 0.0
+
+def singleTrackCouplings(key_pairs, columns, group_arrays, trains_timing, trains_routes):
+    """
+    Vectorized single track line condition (both directions, as in pSingleTrack)
+    """
+    params = [singleTrackParameters(a, b, trains_timing, trains_routes) + singleTrackParameters(b, a, trains_timing, trains_routes) for a, b in key_pairs]
+    params = np.array(params, dtype=float).reshape(-1, 6)
+
+    k, l, p = expandPairs(key_pairs, group_arrays)
+    d, e = columns["d"], columns["edt"]
+    value = np.zeros(len(k))
+    for (first, second), (active, back, forward) in (((k, l), params[:, 0:3].T), ((l, k), params[:, 3:6].T)):
+        time = d[first] + e[first]
+        time1 = d[second] + e[second]
+        value += (active[p] > 0) & (time - back[p] < time1) & (time1 < time + forward[p])
+    return k, l, value
+
+def switchCouplings(key_pairs, columns, group_arrays, trains_timing, trains_routes):
+    """
+    Vectorized switch occupancy condition, a pair of qubits is penalised once even if it conflicts on several switches
+    """
+    pairs, offsets, offsets1 = [], [], []
+    for (tp, sp), (tpp, spp) in key_pairs:
+        for s, pairs_of_switch in switchesOfPair(trains_routes, tp, tpp):
+            if sp == departureStationForSwitches(s, tp, pairs_of_switch, trains_routes):
+                if spp == departureStationForSwitches(s, tpp, pairs_of_switch, trains_routes):
+                    pairs.append(((tp, sp), (tpp, spp)))
+                    offsets.append(tau(trains_timing, "t_pass", first_train=tp, first_station=sp, second_station=s) if s != sp else 0.0)
+                    offsets1.append(tau(trains_timing, "t_pass", first_train=tpp, first_station=spp, second_station=s) if s != spp else 0.0)
+
+    k, l, p = expandPairs(pairs, group_arrays)
+    d, e = columns["d"], columns["edt"]
+    t = d[k] + e[k] + np.array(offsets, dtype=float)[p]
+    t1 = d[l] + e[l] + np.array(offsets1, dtype=float)[p]
+    res = tau(trains_timing, "res")
+    fired = (-res < t1 - t) & (t1 - t < res)
+
+    size = len(columns["d"])
+    kl = np.unique(k[fired] * size + l[fired])
+    return kl // size, kl % size, np.ones(len(kl))
+
+def symmetric(k, l, value):
+    """
+    Helper function to return contributions at k,l together with the same contributions at l,k
+    """
+    return np.concatenate([k, l]), np.concatenate([l, k]), np.concatenate([value, value])
+
+def trackOccupationCouplings(z_groups, columns, group_arrays, trains_timing, trains_routes):
+    """
+    Vectorized quadratic part of track occupation condition, couples qubit of train leaving preceeding station
+    with auxiliary variable of the pair of trains at the station (both orders, as in pTrackOccupationConditionQuadraticPart)
+    """
+    S = trains_routes["Routes"]
+    pairs, first, t_pass = [], [], []
+    for (t, t1, s) in z_groups.keys():
+        for tx, ty, is_first in ((t, t1, True), (t1, t, False)):
+            sx = previousStation(S[tx], s)
+            if sx is not None and indexedPair(trains_routes, "Ttrack", s, tx, ty):
+                pairs.append(((tx, sx), (t, t1, s)))
+                first.append(is_first)
+                t_pass.append(tau(trains_timing, "t_pass", first_train=tx, first_station=sx, second_station=s))
+
+    k, l, p = expandPairs(pairs, group_arrays)
+    d, e = columns["d"], columns["edt"]
+    first, t_pass = np.array(first, dtype=bool)[p], np.array(t_pass, dtype=float)[p]
+    time = d[k] + e[k] + t_pass
+    time_z = d[l] + e[l]
+    time_z1 = columns["d1"][l] + columns["edt1"][l]
+    # the train of qubit k enters the station after the other train of the pair and before it leaves
+    own = np.where(first, time_z, time_z1)
+    other = np.where(first, time_z1, time_z)
+    return symmetric(k, l, ((time < other) & (other <= own)).astype(float))
+
+def rosenbergCouplings(z_groups, columns, group_arrays, size):
+    """
+    Vectorized Rosenberg decomposition of qubic term of track occupation condition (as in pRosenbergDecomposition),
+    penalty of auxiliary variable z = x x1: 3 z - 2 x z - 2 x1 z + x x1
+    """
+    pairs, first = [], []
+    for (t, t1, s) in z_groups.keys():
+        pairs.extend([((t, s), (t, t1, s)), ((t1, s), (t, t1, s))])
+        first.extend([True, False])
+    k, l, p = expandPairs(pairs, group_arrays)
+    first = np.array(first, dtype=bool)[p]
+    d, d1 = columns["d"], columns["d1"]
+    product = d[k] == np.where(first, d[l], d1[l])
+
+    # qubits x, x1 of the product represented by auxiliary variable m
+    x, x1 = np.full(size, -1, dtype=np.int64), np.full(size, -1, dtype=np.int64)
+    x[l[product & first]] = k[product & first]
+    x1[l[product & ~first]] = k[product & ~first]
+    z = np.array([m for ms in z_groups.values() for m in ms], dtype=np.int64)
+    m = z[(x[z] >= 0) & (x1[z] >= 0)]
+
+    rows = np.concatenate([k[product], l[product], x[m], x1[m], z])
+    cols = np.concatenate([l[product], k[product], x1[m], x[m], z])
+    values = np.concatenate([np.full(2 * np.count_nonzero(product), -1.0), np.full(2 * len(m), 0.5), np.full(len(z), 3.0)])
+    return rows, cols, values
+
+def vectorizedFamilies(Problem, inds, groups, family_pairs, inds_z, z_groups):
+    """
+    Function to return weighted hard constrains contributions split by condition {name: (rows, cols, values)},
+    family_pairs are candidate (train, station) pairs of each condition,
+    z_groups are auxiliary variables grouped by (train, train1, station)
+    """
+    trains_timing = Problem.trains_timing
+    trains_routes = Problem.trains_routes
+    columns = indexColumns(concatenateIndices(inds, inds_z), Problem.compiled)
+    group_arrays = groupArrays({**groups, **z_groups})
+
+    families = {
+        "sum": (Problem.p_sum, sumCouplings(list(family_pairs["sum"]), columns, group_arrays)),
+        "headway": (Problem.p_pair, headwayCouplings(list(family_pairs["headway"]), columns, group_arrays, trains_timing, trains_routes)),
+        "minimal_stay": (Problem.p_pair, minimalStayCouplings(list(family_pairs["minimal_stay"]), columns, group_arrays, trains_timing, trains_routes)),
+        "single_track": (Problem.p_pair, singleTrackCouplings(list(family_pairs["single_track"]), columns, group_arrays, trains_timing, trains_routes)),
+        "switch": (Problem.p_pair, switchCouplings(list(family_pairs["switch"]), columns, group_arrays, trains_timing, trains_routes)),
+        "track_occupation": (Problem.p_pair, trackOccupationCouplings(z_groups, columns, group_arrays, trains_timing, trains_routes)),
+        "rosenberg": (Problem.p_qubic, rosenbergCouplings(z_groups, columns, group_arrays, len(columns["d"]))),
+    }
+    return {name: (k, l, weight * v) for name, (weight, (k, l, v)) in families.items()}
+
+def vectorizedCouplings(Problem, inds, groups, family_pairs, inds_z, z_groups):
+    """
+    Function to return weighted hard constrains contributions (rows, cols, values),
+    family_pairs are candidate (train, station) pairs of each condition,
+    z_groups are auxiliary variables grouped by (train, train1, station)
+    """
+    families = vectorizedFamilies(Problem, inds, groups, family_pairs, inds_z, z_groups).values()
+    rows = np.concatenate([k for k, _, _ in families])
+    cols = np.concatenate([l for _, l, _ in families])
+    values = np.concatenate([v for _, _, v in families])
+    return rows, cols, values
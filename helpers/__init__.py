@@ -1,5 +1,5 @@
 """ 
 Initialise import functions from other libraries
 """
-from encoders.QUBO_encoder import subsequentStation, occursAsPair, edt, tau, departureStationForSwitches, indexingForQubo, getCoupling, zIndices, getZCoupling, penalty, pTrackOccupationConditionQuadraticPart, pRosenbergDecomposition, pSwitchOccupation, pHeadway, pMinimalStay, pSingleTrack, makeQubo
-from .helpers_functions_QUBO import previousStation
+from encoders.QUBO_encoder import subsequentStation, edt, tau, departureStationForSwitches, indexingForQubo, quboIndices, getCoupling, zIndices, getZCoupling, penalty, pTrackOccupationConditionQuadraticPart, pRosenbergDecomposition, pSwitchOccupation, pHeadway, pMinimalStay, pSingleTrack, makeQubo
+from .helpers_functions_QUBO import previousStation, occursAsPair
@@ -2,7 +2,8 @@
 Helpers for ILP solver
 """
 import numpy as np
-from helpers import previousStation, occursAsPair 
+from helpers import previousStation
+from helpers.helpers_functions_QUBO import indexedPair
 
 def updateDictOfDicts(d1, d2):
     """
@@ -29,18 +30,17 @@ def canMO(t, tp, s, train_sets):
     """
     Function to check if trains t1 and t2 can meet and overtake (MO) in the line between station and previous station
     """
-    T1 = train_sets["T1"]
     S = train_sets["Routes"]
     sp = previousStation(S[t], s)
     spp = previousStation(S[tp], s)
 
-    if T1 == {}:
+    if train_sets["T1"] == {}:
         return False
     if sp is None or spp is None:
         return False
     if sp != spp:
         return True
-    if occursAsPair(t, tp, T1[sp][s]):
+    if indexedPair(train_sets, "T1", (sp, s), t, tp):
         return False
     return True
 
@@ -48,10 +48,7 @@ def trainsEnteringViaSameSwitches(train_sets, s, t, tp):
     """ 
     Function to check if trains are entering station using common subset od switches
     """
-    if s in train_sets["Tswitch"].keys():
-        v = train_sets["Tswitch"][s]
-        are_switches = np.array([t in e and tp in e for e in v])
-        if True in are_switches:
-            return ('in', 'in') in [(v[i][t], v[i][tp]) for i in np.where(are_switches)[0]]
-        return False
-    return False
+    switches = train_sets["Index"]["Tswitch_trains"]
+    common = switches.get(t, {}).get(s, set()) & switches.get(tp, {}).get(s, set())
+    v = train_sets["Tswitch"].get(s, [])
+    return any((v[i][t], v[i][tp]) == ('in', 'in') for i in common)
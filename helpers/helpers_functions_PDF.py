@@ -1,7 +1,6 @@
 """
 Helpers for PDF formating
 """
-import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import os
@@ -127,7 +126,7 @@ def trains_timings_quantum_to_png(problem, problem_file, problem_number):
     """
     for i in [3,3.5,4,4.5]:
         f = f"files/dwave_data/QUBO_complete_sol_real_anneal_problem{problem_number}_numread2000_antime240_chainst{i}"
-        solutions = load_train_solution(f, i)
+        solutions = load_train_solution(f, i, k=1)
         trains_routes = problem.trains_routes
         trains_trains_timing = problem.trains_timing
         inds, q_bits = indexingForQubo(trains_routes,trains_trains_timing, problem.d_max)
@@ -180,9 +179,8 @@ def trains_timings_simulated_to_png(problem, problem_file, problem_number):
     """
     output_file = f"files/solutions/simulated/train_schedule_simulated{problem_number}.png"
 
-    Q = np.load(problem_file)["Q"]
     f = f"files/QUBO_complete_sol_sim_anneal{problem_number}"
-    solutions, energies, occurrences = load_train_solution(f, 0)
+    solutions = load_train_solution(f, 0, k=1)
 
     trains_routes = problem.trains_routes
     trains_trains_timing = problem.trains_timing
@@ -328,9 +326,8 @@ def trains_timings_simulated_to_pdf(problem, problem_file, problem_number):
     """
     output_file = f"files/solutions/simulated/train_schedule_simulated{problem_number}.pdf"
 
-    Q = np.load(problem_file)["Q"]
     f = f"files/QUBO_complete_sol_sim_anneal{problem_number}"
-    solutions, energies, occurrences = load_train_solution(f, 0)
+    solutions = load_train_solution(f, 0, k=1)
 
     trains_routes = problem.trains_routes
     trains_trains_timing = problem.trains_timing
@@ -4,8 +4,11 @@ Helpers for QUBO creation
 import numpy as np
 import pickle as pk
 import numpy as np
+import scipy.sparse as sp
 import dimod
 
+from helpers.helpers_functions_samples import hasSampleStore, loadSampleStore, samplesetStore, topSamples
+
 def occursAsPair(a, b, vecofvec):
     """
     Function checks whether a and b occurs together in the same vector of vectors 
@@ -15,10 +18,25 @@ def occursAsPair(a, b, vecofvec):
             return True
     return False
 
+def indexedPair(trains_routes, family, key, a, b):
+    """
+    Function checks whether trains a and b occurs together in train set family ("T0", "T1", "Ttrack") at key,
+    using hashed index of train sets
+    """
+    return (a, b) in trains_routes["Index"][family].get(key, ())
+
+def switchesOfPair(trains_routes, a, b):
+    """
+    Function returns list of (s, pairs_of_switch) switches used by exactly trains a and b
+    """
+    return trains_routes["Index"]["Tswitch"].get(frozenset((a, b)), ())
+
 def subsequentStation(route, s):
     """
     Function to return next station in route
     """
+    if hasattr(route, "next_station") and s in route.position:
+        return route.next_station.get(s)
     k = route.index(s)
     if k == len(route) - 1:
         return None
@@ -28,6 +46,8 @@ def previousStation(route, s):
     """
     Function to return preceeding station in the route
     """
+    if hasattr(route, "previous_station") and s in route.position:
+        return route.previous_station.get(s)
     k = route.index(s)
     if k == 0:
         return None
@@ -37,6 +57,10 @@ def tau(trains_timing, key, first_train=None, first_station=None, second_station
     """
     Function that returns particular time span τ(key) for given train and station or stations
     """
+    if "compiled" in trains_timing and key in ("t_pass", "t_stop", "t_headway"):
+        value = compiledTau(trains_timing["compiled"], key, first_train, first_station, second_station, second_train)
+        if not np.isnan(value):
+            return value
     if key == "t_headway":
         return trains_timing["tau"]["t_headway"][
             f"{first_train}_{second_train}_{first_station}_{second_station}"
@@ -52,10 +76,32 @@ def tau(trains_timing, key, first_train=None, first_station=None, second_station
         return trains_timing["tau"]["res"]
     return -1000
 
+def compiledTau(compiled, key, first_train, first_station, second_station=None, second_train=None):
+    """
+    Function that returns time span τ(key) from the arrays of compiled problem, NaN if it is not defined
+    """
+    t = compiled["train_id"].get(str(first_train))
+    s = compiled["station_id"].get(first_station)
+    if t is None or s is None:
+        return np.nan
+    if key == "t_stop":
+        return compiled["t_stop"][t, s]
+    if compiled["next_station"][t, s] != compiled["station_id"].get(second_station, -1):
+        return np.nan
+    if key == "t_pass":
+        return compiled["t_pass"][t, s]
+    t1 = compiled["train_id"].get(str(second_train))
+    if t1 is None:
+        return np.nan
+    return compiled["t_headway"][t, t1, s]
+
 def edt(S, trains_timing, train, station):
     """
     Fuction that returns earliest possible departure of a train from the given station
     """
+    if "edt" in trains_timing:
+        return trains_timing["edt"][(str(train), station)]
+
     if "schedule" in trains_timing:
         sched = trains_timing["schedule"][f"{train}_{station}"]
     else:
@@ -81,20 +127,49 @@ def edt(S, trains_timing, train, station):
 
     return np.maximum(sched, unavoidable)
 
-def load_train_solution(f, i):
-    """
-    Function to load particular DWave solution from file
-    """
-    file = open(
-        f, 'rb')
+def edtTable(S, trains_timing):
+    """
+    Function that returns earliest possible departures of all trains from all stations {(train, station): time},
+    computed in a single forward pass over the routes (stations visited twice keep their first occurrence, as edt)
+    """
+    table = {}
+    for train, route in S.items():
+        previous = None
+        for station in route:
+            if "schedule" in trains_timing:
+                sched = trains_timing["schedule"][f"{train}_{station}"]
+            else:
+                sched = -np.inf
+            train_station = f"{train}_{station}"
 
-    output = pk.load(file)
-    sampleset =  dimod.SampleSet.from_serializable(output)
+            if train_station in trains_timing["t_out"]:
+                unavoidable = trains_timing["t_out"][train_station]
+            else:
+                unavoidable = table[(train, previous)]
+                unavoidable += tau(trains_timing, "t_pass", first_train=train, first_station=previous, second_station=station)
+                unavoidable += tau(trains_timing, "t_stop", first_train=train, first_station=station)
 
-    sorted = np.sort(sampleset.record, order="energy")
-    solutions = [sol[0] for sol in sorted]
+            table.setdefault((train, station), np.maximum(sched, unavoidable))
+            previous = station
+    return table
 
-    return solutions
+def loadSolutionStore(f):
+    """
+    Function to load DWave solutions as sample store (sample store file or older pickled sampleset)
+    """
+    if hasSampleStore(f):
+        return loadSampleStore(f)
+    with open(f, 'rb') as file:
+        return samplesetStore(dimod.SampleSet.from_serializable(pk.load(file)))
+
+def load_train_solution(f, i, k=None, feasible=None):
+    """
+    Function to load particular DWave solution from file (sample store or older pickled sampleset), sorted by energy,
+    k - number of best solutions (all if None), feasible - function selecting feasible samples (see oneHotFeasible)
+    """
+    store = loadSolutionStore(f)
+    _, solutions = topSamples(store, len(store["energy"]) if k is None else k, feasible)
+    return list(solutions)
 
 def departureStationForSwitches(s, j, place_of_switch, trains_routes):
     """
@@ -107,13 +182,43 @@ def departureStationForSwitches(s, j, place_of_switch, trains_routes):
         return previousStation(S[j], s)
     return 0
 
+def binarySamples(X):
+    """
+    Function to return samples (rows) as 0/1 array, spin samples (with -1) are converted to binary
+    """
+    X = np.atleast_2d(np.asarray(X))
+    if X.size and X.min() < 0:
+        X = (X + 1) // 2
+    return X
+
+def energies(X, Q, chunk=1024):
+    """
+    Function to compute energies x Q x of samples (rows of X, binary or spin) with sparse (or dense) QUBO matrix,
+    samples are evaluated in chunks of rows
+    """
+    X = binarySamples(X)
+    QT = sp.csr_matrix(Q, dtype=np.float64).T.tocsr()
+    result = np.empty(len(X))
+    for start in range(0, len(X), chunk):
+        block = np.asarray(X[start:start + chunk], dtype=np.float64)
+        result[start:start + chunk] = np.einsum("ri,ri->r", block, np.asarray((QT @ block.T).T))
+    return result
+
+def familyEnergies(X, families, chunk=1024):
+    """
+    Function to compute energies of samples split by constraint families {name: energies}, families are matrices of quboFamilies
+    """
+    X = binarySamples(X)
+    return {name: energies(X, Q, chunk) for name, Q in families.items()}
+
+def verifyEnergies(X, reported, Q, offset=0.0, atol=1e-6):
+    """
+    Function checks which reported energies (e.g. of solver samples) agree with energies of the QUBO matrix
+    """
+    return np.isclose(energies(X, Q) + offset, np.asarray(reported, dtype=np.float64), rtol=0.0, atol=atol)
+
 def energy(v, Q):
     """
     Function to compute energy from QUBO
     """
-    if -1 in v:
-        v = [(y + 1) / 2 for y in v]
-    X = np.array(Q)
-    V = np.array(v)
-
-    return V @ X @ V.transpose()
+    return energies([v], Q)[0]
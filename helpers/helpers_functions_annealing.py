@@ -0,0 +1,122 @@
+"""
+Helpers for simulated annealing - annealing profile and reads split across a process pool
+
+Profile is a dict of neal.SimulatedAnnealingSampler parameters, number of workers and engine
+(neal, numpy - annealing of solvers.QUBO_annealer, tabu - tabu search of solvers.QUBO_annealer with num_sweeps steps,
+swap - annealing with delay swaps inside one hot groups of the problem),
+it can be read from JSON file and overridden from the command line.
+Each worker gets its own seed spawned from the profile seed, so runs with given seed are reproducible.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import dimod
+import neal
+import numpy as np
+
+from helpers.helpers_functions_matrix import bqmToQubo
+from solvers.QUBO_annealer import simulatedAnnealing, swapAnnealing, tabuSearch
+
+SIMULATED_ANNEALING = {
+    "num_reads": 1000,
+    "num_sweeps": 4000,
+    "beta_range": [5, 100],
+    "beta_schedule_type": "geometric",
+    "beta_schedule": None,
+    "seed": None,
+    "workers": 1,
+    "engine": "neal",
+}
+
+ENGINES = ("neal", "numpy", "tabu", "swap")
+
+def annealingProfile(config_file=None, **overrides):
+    """
+    Function to return simulated annealing profile - defaults updated by JSON config file and overrides (None values are skipped)
+    """
+    profile = dict(SIMULATED_ANNEALING)
+    if config_file is not None:
+        with open(config_file) as handle:
+            config = json.load(handle)
+        unknown = set(config) - set(SIMULATED_ANNEALING)
+        if unknown:
+            raise ValueError(f"unknown simulated annealing parameters: {', '.join(sorted(unknown))}")
+        profile.update(config)
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+    if profile["engine"] not in ENGINES:
+        raise ValueError(f"unknown simulated annealing engine: {profile['engine']}")
+    if profile["workers"] is None or profile["workers"] < 1:
+        profile["workers"] = os.cpu_count() or 1
+    return profile
+
+def readsOfWorkers(num_reads, workers):
+    """
+    Function to split number of reads to workers as evenly as possible (workers without reads are dropped)
+    """
+    reads = [num_reads // workers + (1 if i < num_reads % workers else 0) for i in range(workers)]
+    return [r for r in reads if r > 0]
+
+def seedsOfWorkers(seed, workers):
+    """
+    Function to return independent 31 bit seeds of workers spawned from the profile seed (random if seed is None)
+    """
+    children = np.random.SeedSequence(seed).spawn(workers)
+    return [int(child.generate_state(1)[0] >> 1) for child in children]
+
+def samplerParameters(profile):
+    """
+    Function to return parameters of the sampler (engine) from the profile
+    """
+    parameters = {
+        "engine": profile["engine"],
+        "num_sweeps": profile["num_sweeps"],
+        "beta_schedule_type": profile["beta_schedule_type"],
+    }
+    if profile["beta_schedule_type"] == "custom":
+        parameters["beta_schedule"] = np.asarray(profile["beta_schedule"], dtype=float)
+        parameters.pop("num_sweeps")
+    elif profile["beta_range"] is not None:
+        parameters["beta_range"] = tuple(profile["beta_range"])
+    return parameters
+
+def sampleReads(bqm, num_reads, seed, parameters):
+    """
+    Function to run simulated annealing of one worker
+    """
+    parameters = dict(parameters)
+    engine = parameters.pop("engine", "neal")
+    if engine == "neal":
+        sampler = neal.SimulatedAnnealingSampler()
+        return sampler.sample(bqm, num_reads=num_reads, seed=seed, **parameters)
+
+    Q = bqmToQubo(bqm)
+    if engine == "tabu":
+        samples, energies = tabuSearch(Q, num_reads, parameters.get("num_sweeps") or len(parameters["beta_schedule"]), seed=seed)
+        return dimod.SampleSet.from_samples((samples, range(bqm.num_variables)), dimod.BINARY, energies + bqm.offset)
+
+    schedule = parameters.get("beta_schedule")
+    if engine == "swap":
+        samples, energies = swapAnnealing(Q, parameters["groups"], num_reads, parameters.get("num_sweeps"), parameters.get("beta_range"), parameters["beta_schedule_type"], seed, schedule)
+    else:
+        samples, energies = simulatedAnnealing(Q, num_reads, parameters.get("num_sweeps"), parameters.get("beta_range"), parameters["beta_schedule_type"], seed, schedule=schedule)
+    return dimod.SampleSet.from_samples((samples, range(bqm.num_variables)), dimod.BINARY, energies + bqm.offset)
+
+def parallelSimAnnealing(bqm, profile, groups=None):
+    """
+    Function to run simulated annealing with reads split across workers (processes), samplesets are merged to one,
+    groups - lists of qubits of one hot groups (needed by swap engine)
+    """
+    reads = readsOfWorkers(profile["num_reads"], profile["workers"])
+    seeds = seedsOfWorkers(profile["seed"], len(reads))
+    parameters = samplerParameters(profile)
+    if profile["engine"] == "swap":
+        if groups is None:
+            raise ValueError("swap engine needs one hot groups of the problem")
+        parameters["groups"] = groups
+    if len(reads) == 1:
+        return sampleReads(bqm, reads[0], seeds[0], parameters)
+
+    with ProcessPoolExecutor(max_workers=len(reads)) as executor:
+        samplesets = list(executor.map(sampleReads, [bqm] * len(reads), reads, seeds, [parameters] * len(reads)))
+    return dimod.concatenate(samplesets)
@@ -0,0 +1,149 @@
+"""
+Helpers for content addressed cache of parsed problems and generated QUBO matrices
+
+Entries are keyed by hash of the timetable XML, location links CSV and problem parameters,
+so repeated runs on the same timetable skip parsing and encoding.
+The cache is bounded by size, least recently used entries are removed first.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+from encoders.QUBO_encoder import makeQubo, indexingForQubo
+from helpers.helpers_functions import getProblem
+from helpers.helpers_functions_matrix import saveQuboMatrix, loadQuboMatrix, upperTriangular
+from problems.railway_problems import PARAMETERS
+from problems.read_files_to_problem import readScheduleXml
+
+CACHE_DIR = "files/cache"
+CACHE_SIZE = 256 * 1024 * 1024
+LOCATION_LINKS_FILE = "data/LocationLinksData.csv"
+# version of cached data layout, change it when parsed problem or QUBO encoding changes
+CACHE_VERSION = 7
+
+def cacheKey(xml_file, parameters=PARAMETERS, csv_file=LOCATION_LINKS_FILE):
+    """
+    Function to return cache key - hash of XML and CSV files content, problem parameters and cache version
+    """
+    h = hashlib.sha256(str(CACHE_VERSION).encode())
+    for file in (xml_file, csv_file):
+        with open(file, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    h.update(json.dumps({p: parameters[p] for p in PARAMETERS}, sort_keys=True).encode())
+    return h.hexdigest()
+
+def problemParameters(Problem):
+    """
+    Function to return parameters of the problem which are part of the cache key
+    """
+    return {p: getattr(Problem, p) for p in PARAMETERS}
+
+def cachePath(key, suffix, cache_dir=CACHE_DIR):
+    """
+    Function to return path of the cache entry
+    """
+    return os.path.join(cache_dir, f"{key}.{suffix}")
+
+def touch(path):
+    """
+    Function to mark cache entry as recently used
+    """
+    os.utime(path)
+
+def evictCache(cache_dir=CACHE_DIR, max_size=CACHE_SIZE):
+    """
+    Function to remove least recently used cache entries until cache size is below max_size
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir)]
+    entries = sorted((os.path.getmtime(f), os.path.getsize(f), f) for f in entries if os.path.isfile(f))
+    size = sum(s for _, s, _ in entries)
+    for _, s, f in entries:
+        if size <= max_size:
+            break
+        os.remove(f)
+        size -= s
+
+def loadCachedProblem(key, cache_dir=CACHE_DIR):
+    """
+    Function to load parsed problem from cache, None if it is not there
+    """
+    path = cachePath(key, "problem.pkl", cache_dir)
+    if not os.path.exists(path):
+        return None
+    touch(path)
+    with open(path, "rb") as handle:
+        return pickle.load(handle)
+
+def saveCachedProblem(key, problem, cache_dir=CACHE_DIR, max_size=CACHE_SIZE):
+    """
+    Function to save parsed problem to cache
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cachePath(key, "problem.pkl", cache_dir), "wb") as handle:
+        pickle.dump(problem, handle)
+    evictCache(cache_dir, max_size)
+
+def loadCachedQubo(key, cache_dir=CACHE_DIR):
+    """
+    Function to load QUBO matrix (sparse upper triangular) from cache, None if it is not there
+    """
+    path = cachePath(key, "qubo.npz", cache_dir)
+    if not os.path.exists(path):
+        return None
+    touch(path)
+    return loadQuboMatrix(path)
+
+def saveCachedQubo(key, Q, cache_dir=CACHE_DIR, max_size=CACHE_SIZE, **metadata):
+    """
+    Function to save QUBO matrix to cache
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    saveQuboMatrix(cachePath(key, "qubo.npz", cache_dir), Q, **metadata)
+    evictCache(cache_dir, max_size)
+
+def loadCachedStatistics(key, cache_dir=CACHE_DIR):
+    """
+    Function to load QUBO statistics from cache, None if they are not there
+    """
+    path = cachePath(key, "stats.json", cache_dir)
+    if not os.path.exists(path):
+        return None
+    touch(path)
+    with open(path) as handle:
+        return json.load(handle)
+
+def saveCachedStatistics(key, statistics, cache_dir=CACHE_DIR, max_size=CACHE_SIZE):
+    """
+    Function to save QUBO statistics to cache
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cachePath(key, "stats.json", cache_dir), "w") as handle:
+        json.dump(statistics, handle)
+    evictCache(cache_dir, max_size)
+
+def cachedProblem(xml_file, problem_number=None):
+    """
+    Function to return problem of the XML file from cache, or read it and save it to cache
+    """
+    key = cacheKey(xml_file)
+    problem = loadCachedProblem(key)
+    if problem is None:
+        taus, trains_timing, trains_routes = readScheduleXml(xml_file)
+        problem = getProblem(problem_number, taus, trains_timing, trains_routes)
+        saveCachedProblem(key, problem)
+    return problem
+
+def cachedQubo(xml_file, problem, workers=1):
+    """
+    Function to return QUBO matrix (sparse upper triangular) of the problem from cache, or make it and save it to cache
+    """
+    key = cacheKey(xml_file, problemParameters(problem))
+    Q = loadCachedQubo(key)
+    if Q is None:
+        Q = upperTriangular(makeQubo(problem, workers=workers))
+        _, q_bits = indexingForQubo(problem.trains_routes, problem.trains_timing, problem.d_max)
+        saveCachedQubo(key, Q, q_bits=q_bits)
+    return Q
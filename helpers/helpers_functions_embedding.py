@@ -0,0 +1,115 @@
+"""
+Helpers for quantum annealing - one embedding of the QUBO reused by runs of all chain strengths
+
+Embedding is searched once and passed to FixedEmbeddingComposite, runs with different chain strengths
+are submitted to the sampler concurrently. localSampler is a stand in of the QPU (simulated annealing
+restricted to synthetic Pegasus graph) for runs without D-Wave access.
+Embeddings are kept in the cache folder, keyed by hash of the sparsity pattern of the QUBO and of the target graph,
+so runs on QUBOs with the same structure skip the embedding search.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import dimod
+import minorminer
+import neal
+from dwave.graphs import pegasus_graph
+from dwave.system import DWaveSampler, FixedEmbeddingComposite
+from helpers.helpers_functions_cache import CACHE_DIR, CACHE_SIZE, cachePath, touch, evictCache
+
+CHAIN_STRENGTHS = [3, 3.5, 4, 4.5]
+
+def quantumSampler(token=''):
+    """
+    Function to return D-Wave QPU sampler
+    """
+    return DWaveSampler(token=token)
+
+def localSampler(size=16):
+    """
+    Function to return local stand in of QPU sampler - simulated annealing with structure of Pegasus graph P(size)
+    """
+    graph = pegasus_graph(size)
+    return dimod.StructureComposite(neal.SimulatedAnnealingSampler(), sorted(graph.nodes), sorted(graph.edges))
+
+def findEmbedding(bqm, sampler, seed=None):
+    """
+    Function to find minor embedding {variable: [qubits]} of the binary quadratic model to the graph of the sampler,
+    variables without couplings get free qubits
+    """
+    embedding = minorminer.find_embedding(list(bqm.quadratic), sampler.edgelist, random_seed=seed)
+    if not embedding and bqm.num_interactions:
+        raise ValueError("no embedding of the QUBO to the sampler graph found")
+    used = {q for chain in embedding.values() for q in chain}
+    free = iter(q for q in sampler.nodelist if q not in used)
+    for v in bqm.variables:
+        if v not in embedding:
+            embedding[v] = [next(free)]
+    return embedding
+
+def graphHash(nodes, edges):
+    """
+    Function to return hash of the graph (sorted nodes and edges with smaller node first)
+    """
+    h = hashlib.sha256(json.dumps(sorted(nodes)).encode())
+    h.update(json.dumps(sorted(sorted(edge) for edge in edges)).encode())
+    return h.hexdigest()
+
+def embeddingKey(bqm, sampler):
+    """
+    Function to return cache key of the embedding - hash of the sparsity pattern of the model and of the target graph
+    """
+    h = hashlib.sha256(b"embedding")
+    h.update(graphHash(bqm.variables, bqm.quadratic).encode())
+    h.update(graphHash(sampler.nodelist, sampler.edgelist).encode())
+    return h.hexdigest()
+
+def loadCachedEmbedding(key, cache_dir=CACHE_DIR):
+    """
+    Function to load embedding from cache, None if it is not there
+    """
+    path = cachePath(key, "embedding.json", cache_dir)
+    if not os.path.exists(path):
+        return None
+    touch(path)
+    with open(path) as handle:
+        return {int(v): chain for v, chain in json.load(handle).items()}
+
+def saveCachedEmbedding(key, embedding, cache_dir=CACHE_DIR, max_size=CACHE_SIZE):
+    """
+    Function to save embedding to cache
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cachePath(key, "embedding.json", cache_dir), "w") as handle:
+        json.dump({int(v): [int(q) for q in chain] for v, chain in embedding.items()}, handle)
+    evictCache(cache_dir, max_size)
+
+def cachedEmbedding(bqm, sampler, cache_dir=CACHE_DIR, seed=None):
+    """
+    Function to return embedding of the model to the sampler graph from cache, or find it and save it to cache
+    """
+    key = embeddingKey(bqm, sampler)
+    embedding = loadCachedEmbedding(key, cache_dir)
+    if embedding is None:
+        embedding = findEmbedding(bqm, sampler, seed)
+        saveCachedEmbedding(key, embedding, cache_dir)
+    return embedding
+
+def sampleChainStrengths(bqm, sampler, embedding, chain_strengths=CHAIN_STRENGTHS, **parameters):
+    """
+    Function to sample the binary quadratic model with every chain strength concurrently using one embedding,
+    parameters not supported by the sampler are skipped, returns {chain_strength: sampleset}
+    """
+    composite = FixedEmbeddingComposite(sampler, embedding)
+    parameters = {p: value for p, value in parameters.items() if p in sampler.parameters}
+
+    def sample(chain_strength):
+        sampleset = composite.sample(bqm, chain_strength=chain_strength, **parameters)
+        sampleset.resolve()
+        return sampleset
+
+    with ThreadPoolExecutor(max_workers=len(chain_strengths)) as executor:
+        samplesets = list(executor.map(sample, chain_strengths))
+    return dict(zip(chain_strengths, samplesets))
@@ -0,0 +1,85 @@
+"""
+Helpers for QUBO matrix storage
+
+QUBO matrix is stored as compressed .npz file with upper triangular CSR arrays
+(data, indices, indptr, shape) and index metadata, so size of the file scales with non zero couplings.
+Files with dense matrix "Q" (older format) can still be read and converted.
+"""
+import dimod
+import numpy as np
+import scipy.sparse as sp
+
+SPARSE_FORMAT = "csr_upper"
+
+def upperTriangular(Q):
+    """
+    Function to fold QUBO matrix to upper triangular form (Q[i, j] + Q[j, i] for i < j), energy stays the same
+    """
+    Q = sp.csr_matrix(Q)
+    U = sp.triu(Q, k=1) + sp.triu(Q.T, k=1) + sp.diags(Q.diagonal())
+    U = sp.csr_matrix(U)
+    U.eliminate_zeros()
+    U.sort_indices()
+    return U
+
+def quboVectors(Q):
+    """
+    Function to return linear biases and quadratic (rows, cols, biases) of QUBO matrix, with pairs folded to i < j
+    """
+    U = upperTriangular(Q).tocoo()
+    off_diagonal = U.row != U.col
+    linear = U.diagonal()
+    quadratic = (U.row[off_diagonal], U.col[off_diagonal], U.data[off_diagonal])
+    return linear, quadratic
+
+def quboToBqm(Q, dtype=np.float64):
+    """
+    Function to create binary quadratic model straight from the (sparse) QUBO matrix, without dense matrix or qubo dict
+    """
+    linear, quadratic = quboVectors(Q)
+    return dimod.BinaryQuadraticModel.from_numpy_vectors(linear, quadratic, 0.0, dimod.BINARY, dtype=dtype)
+
+def bqmToQubo(bqm):
+    """
+    Function to return sparse upper triangular QUBO matrix of binary quadratic model with variables 0..n-1 (inverse of quboToBqm)
+    """
+    n = bqm.num_variables
+    linear, (rows, cols, biases), _ = bqm.to_numpy_vectors(variable_order=range(n))
+    U = sp.coo_matrix((biases, (np.minimum(rows, cols), np.maximum(rows, cols))), shape=(n, n)) + sp.diags(linear)
+    return upperTriangular(U)
+
+def saveQuboMatrix(file, Q, **metadata):
+    """
+    Function to save QUBO matrix (dense or sparse) as compressed sparse upper triangular file,
+    metadata (e.g. q_bits - number of not auxiliary variables) are saved as integers
+    """
+    U = upperTriangular(Q)
+    metadata = {key: np.int64(value) for key, value in metadata.items()}
+    np.savez_compressed(file, format=SPARSE_FORMAT, data=U.data, indices=U.indices, indptr=U.indptr, shape=np.array(U.shape), **metadata)
+
+def loadQuboMatrix(file):
+    """
+    Function to load QUBO matrix as sparse upper triangular CSR matrix, from sparse or older dense file
+    """
+    with np.load(file) as f:
+        if "Q" in f.files:
+            return upperTriangular(f["Q"])
+        return sp.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+
+def loadQuboMetadata(file):
+    """
+    Function to load metadata saved with QUBO matrix, without reading the matrix itself
+    """
+    with np.load(file) as f:
+        return {key: int(f[key]) for key in f.files if key not in ("format", "data", "indices", "indptr", "shape", "Q")}
+
+def convertQuboMatrix(file):
+    """
+    Function to convert file with dense QUBO matrix to compressed sparse file (in place)
+    """
+    with np.load(file) as f:
+        if "Q" not in f.files:
+            return False
+        Q = f["Q"]
+    saveQuboMatrix(file, Q)
+    return True
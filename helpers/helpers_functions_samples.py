@@ -0,0 +1,130 @@
+"""
+Helpers for columnar storage of annealing samples
+
+Samples are stored in folder {file}.samples as bit packed array samples.npy (one row of np.packbits per read),
+columns energy.npy and num_occurrences.npy and meta.json (number of variables and run metadata, e.g. chain strength).
+All arrays are .npy files, so they can be memory mapped and read without dimod.
+"""
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+STORE_SUFFIX = ".samples"
+
+def storePath(file):
+    """
+    Function to return folder of the sample store of the results file
+    """
+    return file if file.endswith(STORE_SUFFIX) else file + STORE_SUFFIX
+
+def hasSampleStore(file):
+    """
+    Function checks whether results file has sample store
+    """
+    return os.path.isdir(storePath(file))
+
+def samplesetColumns(sampleset):
+    """
+    Function to return samples (columns ordered by variable 0..n-1), energies and occurrences of dimod sampleset
+    """
+    record = sampleset.record
+    order = np.argsort(np.asarray(list(sampleset.variables)), kind="stable")
+    return record.sample[:, order], record.energy, record.num_occurrences
+
+def saveSampleStore(file, samples, energies, occurrences=None, **metadata):
+    """
+    Function to save samples (reads x variables, 0/1) with their energies and occurrences to sample store
+    """
+    samples = np.asarray(samples, dtype=np.uint8)
+    if occurrences is None:
+        occurrences = np.ones(len(samples), dtype=np.int64)
+    path = storePath(file)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "samples.npy"), np.packbits(samples, axis=1))
+    np.save(os.path.join(path, "energy.npy"), np.asarray(energies, dtype=np.float64))
+    np.save(os.path.join(path, "num_occurrences.npy"), np.asarray(occurrences, dtype=np.int64))
+    with open(os.path.join(path, "meta.json"), "w") as handle:
+        json.dump({"num_variables": samples.shape[1], "num_reads": samples.shape[0], **metadata}, handle)
+
+def saveSampleset(file, sampleset, **metadata):
+    """
+    Function to save dimod sampleset to sample store
+    """
+    saveSampleStore(file, *samplesetColumns(sampleset), **metadata)
+
+def loadSampleStore(file, mmap=True):
+    """
+    Function to load sample store {"samples": packed rows, "energy", "num_occurrences", "meta"}, arrays are memory mapped
+    """
+    path = storePath(file)
+    mode = "r" if mmap else None
+    with open(os.path.join(path, "meta.json")) as handle:
+        meta = json.load(handle)
+    return {
+        "samples": np.load(os.path.join(path, "samples.npy"), mmap_mode=mode),
+        "energy": np.load(os.path.join(path, "energy.npy"), mmap_mode=mode),
+        "num_occurrences": np.load(os.path.join(path, "num_occurrences.npy"), mmap_mode=mode),
+        "meta": meta,
+    }
+
+def unpackSamples(store, rows):
+    """
+    Function to return samples of given rows of the store as 0/1 array (rows x variables)
+    """
+    packed = store["samples"][np.asarray(rows)]
+    return np.unpackbits(packed, axis=1, count=store["meta"]["num_variables"])
+
+def samplesetStore(sampleset):
+    """
+    Function to return dimod sampleset as in memory sample store (for older pickled results)
+    """
+    samples, energies, occurrences = samplesetColumns(sampleset)
+    return {
+        "samples": np.packbits(np.asarray(samples, dtype=np.uint8), axis=1),
+        "energy": np.asarray(energies, dtype=np.float64),
+        "num_occurrences": np.asarray(occurrences, dtype=np.int64),
+        "meta": {"num_variables": samples.shape[1], "num_reads": samples.shape[0]},
+    }
+
+def lowestRows(energy, k):
+    """
+    Function to return rows of k lowest energies sorted by energy (ties by row), without sorting all energies
+    """
+    energy = np.asarray(energy)
+    if k >= len(energy):
+        return np.argsort(energy, kind="stable")
+    kth = energy[np.argpartition(energy, k - 1)[k - 1]]
+    rows = np.flatnonzero(energy <= kth)
+    return rows[np.argsort(energy[rows], kind="stable")][:k]
+
+def topSamples(store, k=1, feasible=None):
+    """
+    Function to return rows and samples of k best reads of the store, only rows which are needed are unpacked,
+    feasible - function returning boolean array of feasible samples (rows of 0/1 array), infeasible samples are skipped
+    """
+    energy = np.asarray(store["energy"])
+    m = min(k, len(energy))
+    while True:
+        rows = lowestRows(energy, m)
+        samples = unpackSamples(store, rows)
+        if feasible is None:
+            return rows, samples
+        ok = feasible(samples)
+        if np.count_nonzero(ok) >= k or m == len(energy):
+            return rows[ok][:k], samples[ok][:k]
+        m = min(4 * m, len(energy))
+
+def oneHotFeasible(groups, num_variables):
+    """
+    Function to return function checking which samples have exactly one qubit set in every group (one delay of train at station)
+    """
+    members = np.concatenate([np.asarray(g, dtype=np.int64) for g in groups])
+    group_of = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+    G = sp.csr_matrix((np.ones(len(members), dtype=np.int64), (members, group_of)), shape=(num_variables, len(groups)))
+
+    def feasible(samples):
+        counts = G.T @ np.asarray(samples, dtype=np.int64).T
+        return np.all(counts == 1, axis=0)
+    return feasible
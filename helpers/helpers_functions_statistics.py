@@ -0,0 +1,74 @@
+"""
+Helpers for QUBO statistics - size of the graph, degrees and coefficients, computed on sparse matrices
+"""
+import json
+import numpy as np
+import scipy.sparse as sp
+
+from helpers.helpers_functions_matrix import upperTriangular
+
+def coefficientRange(values):
+    """
+    Function to return min, max and min of absolute value of non zero coefficients
+    """
+    if len(values) == 0:
+        return {"min": None, "max": None, "abs_min": None}
+    return {"min": float(values.min()), "max": float(values.max()), "abs_min": float(np.abs(values).min())}
+
+def graphOfQubo(Q):
+    """
+    Function to return upper triangular QUBO matrix split to diagonal (linear) and off diagonal (edges) part
+    """
+    U = upperTriangular(Q).tocoo()
+    off_diagonal = U.row != U.col
+    edges = sp.coo_matrix((U.data[off_diagonal], (U.row[off_diagonal], U.col[off_diagonal])), shape=U.shape)
+    return U.diagonal(), edges
+
+def familyStatistics(F):
+    """
+    Function to return statistics of contribution of one constraint family to QUBO
+    """
+    linear, edges = graphOfQubo(F)
+    return {
+        "linear_terms": int(np.count_nonzero(linear)),
+        "edges": int(edges.nnz),
+        "linear": coefficientRange(linear[linear != 0]),
+        "quadratic": coefficientRange(edges.data),
+    }
+
+def quboStatistics(Q, families=None, q_bits=None):
+    """
+    Function to return statistics of QUBO graph: n.o. qubits, edges, degree distribution, coefficient ranges
+    and (when families {name: matrix} are given) contribution of each constraint family
+    """
+    linear, edges = graphOfQubo(Q)
+    n = edges.shape[0]
+    degree = np.bincount(edges.row, minlength=n) + np.bincount(edges.col, minlength=n)
+    degrees, counts = np.unique(degree, return_counts=True)
+
+    statistics = {
+        "qubits": int(n),
+        "edges": int(edges.nnz),
+        "density": float(edges.nnz / (n * (n - 1) / 2)) if n > 1 else 0.0,
+        "degree": {
+            "min": int(degree.min()) if n else 0,
+            "max": int(degree.max()) if n else 0,
+            "mean": float(degree.mean()) if n else 0.0,
+            "distribution": {str(d): int(c) for d, c in zip(degrees, counts)},
+        },
+        "linear": coefficientRange(linear[linear != 0]),
+        "quadratic": coefficientRange(edges.data),
+    }
+    if q_bits is not None:
+        statistics["x_qubits"] = int(q_bits)
+        statistics["auxiliary_qubits"] = int(n - q_bits)
+    if families is not None:
+        statistics["families"] = {name: familyStatistics(F) for name, F in families.items()}
+    return statistics
+
+def saveQuboStatistics(file, statistics):
+    """
+    Function to save QUBO statistics as JSON file
+    """
+    with open(file, "w") as handle:
+        json.dump(statistics, handle, indent=2)
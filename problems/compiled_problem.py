@@ -0,0 +1,116 @@
+"""
+Compiled problem - integer interned representation of the problem, where trains and stations
+are dense ids and the timing data lives in NumPy arrays indexed by those ids.
+The dict based trains_timing and trains_routes are kept as they are and serve as compatibility layer.
+"""
+import itertools
+import numpy as np
+
+def internNames(trains_routes):
+    """
+    Function to assign dense integer ids to trains and stations (in order of appearance in routes)
+    """
+    trains = list(trains_routes["T"])
+    stations = []
+    station_id = {}
+    for t in trains:
+        for s in trains_routes["Routes"][t]:
+            if s not in station_id:
+                station_id[s] = len(stations)
+                stations.append(s)
+    train_id = {t: i for i, t in enumerate(trains)}
+    return trains, stations, train_id, station_id
+
+def compileRoutes(compiled, trains_routes):
+    """
+    Function to fill route arrays: station ids of routes, position of station in route, next and previous station
+    """
+    n_trains = len(compiled["trains"])
+    n_stations = len(compiled["stations"])
+    station_id = compiled["station_id"]
+    position = np.full((n_trains, n_stations), -1, dtype=np.int32)
+    next_station = np.full((n_trains, n_stations), -1, dtype=np.int32)
+    previous_station = np.full((n_trains, n_stations), -1, dtype=np.int32)
+    routes = []
+    for i, t in enumerate(compiled["trains"]):
+        route = np.array([station_id[s] for s in trains_routes["Routes"][t]], dtype=np.int32)
+        # stations visited twice keep their first occurrence, as route.index
+        stations, first = np.unique(route, return_index=True)
+        position[i, stations] = first
+        has_next = first < len(route) - 1
+        next_station[i, stations[has_next]] = route[first[has_next] + 1]
+        has_previous = first > 0
+        previous_station[i, stations[has_previous]] = route[first[has_previous] - 1]
+        routes.append(route)
+
+    compiled["routes"] = routes
+    compiled["position"] = position
+    compiled["next_station"] = next_station
+    compiled["previous_station"] = previous_station
+
+def compileTimings(compiled, trains_routes, trains_timing):
+    """
+    Function to fill timing arrays, missing values are NaN
+
+    t_pass[t, s] - passing time from station s to the next station on the route of train t
+    t_stop[t, s], t_out[t, s] - stop time and time of leaving the first station
+    t_headway[t, t1, s] - headway between first train t and second train t1 on the line from station s to the next one
+    edt[t, s] - earliest possible departure time
+    """
+    n_trains = len(compiled["trains"])
+    n_stations = len(compiled["stations"])
+    train_id = compiled["train_id"]
+    station_id = compiled["station_id"]
+    taus = trains_timing["tau"]
+    t_pass = np.full((n_trains, n_stations), np.nan)
+    t_stop = np.full((n_trains, n_stations), np.nan)
+    t_out = np.full((n_trains, n_stations), np.nan)
+    t_headway = np.full((n_trains, n_trains, n_stations), np.nan)
+    edt = np.full((n_trains, n_stations), np.nan)
+
+    next_station = compiled["next_station"]
+    for i, t in enumerate(compiled["trains"]):
+        route = trains_routes["Routes"][t]
+        for s, s_next in zip(route, route[1:]):
+            key = f"{t}_{s}_{s_next}"
+            # stations visited twice keep the line of their first occurrence, as next_station
+            if key in taus["t_pass"] and next_station[i, station_id[s]] == station_id[s_next]:
+                t_pass[i, station_id[s]] = taus["t_pass"][key]
+        for s in route:
+            key = f"{t}_{s}"
+            if key in taus["t_stop"]:
+                t_stop[i, station_id[s]] = taus["t_stop"][key]
+            if key in trains_timing["t_out"]:
+                t_out[i, station_id[s]] = trains_timing["t_out"][key]
+            if "edt" in trains_timing:
+                edt[i, station_id[s]] = trains_timing["edt"][(t, s)]
+
+    for s in trains_routes["T1"].keys():
+        for s_next in trains_routes["T1"][s].keys():
+            for ts in trains_routes["T1"][s][s_next]:
+                for (t, t1) in itertools.permutations(ts, 2):
+                    key = f"{t}_{t1}_{s}_{s_next}"
+                    if key in taus["t_headway"] and next_station[train_id[t], station_id[s]] == station_id[s_next]:
+                        t_headway[train_id[t], train_id[t1], station_id[s]] = taus["t_headway"][key]
+
+    compiled["t_pass"] = t_pass
+    compiled["t_stop"] = t_stop
+    compiled["t_out"] = t_out
+    compiled["t_headway"] = t_headway
+    compiled["edt"] = edt
+
+def compileProblem(trains_routes, trains_timing):
+    """
+    Function to compile problem dicts to integer interned, array backed representation
+    """
+    trains, stations, train_id, station_id = internNames(trains_routes)
+    compiled = {
+        "trains": trains,
+        "stations": stations,
+        "train_id": train_id,
+        "station_id": station_id,
+        "res": trains_timing["tau"]["res"],
+    }
+    compileRoutes(compiled, trains_routes)
+    compileTimings(compiled, trains_routes, trains_timing)
+    return compiled
@@ -1,13 +1,42 @@
 """
 Defined railway network
 """
+import copy
+
+from helpers.helpers_functions_QUBO import edtTable
+from problems.compiled_problem import compileProblem
+from encoders.QUBO_presolve import presolveDomains
+
+# penalty parameters and maximal secondary delay of the problem
+PARAMETERS = {
+    "p_sum": 2.5,
+    "p_pair": 1.25,
+    "p_qubic": 2.1,
+    "d_max": 5,
+    # prune delays which can not be part of assignment without penalty before QUBO is built
+    "presolve": False,
+}
+
+# keys of trains_timing derived from the timings by Problem, never taken from the given dict
+DERIVED_TIMING = ("edt", "compiled", "domains")
 
 class Problem():
     def __init__(self, taus, trains_timing, trains_routes):
         self.taus = taus
-        self.trains_timing = trains_timing
+        # own copy of the timings without derived data, so derived data of other timings (e.g. of the problem
+        # the timings were copied from) is not reused and derived data of this problem does not leak to the given dict
+        self.trains_timing = copy.deepcopy({key: value for key, value in trains_timing.items() if key not in DERIVED_TIMING})
         self.trains_routes = trains_routes
-        self.p_sum = 2.5
-        self.p_pair = 1.25
-        self.p_qubic = 2.1
-        self.d_max = 5
\ No newline at end of file
+        self.p_sum = PARAMETERS["p_sum"]
+        self.p_pair = PARAMETERS["p_pair"]
+        self.p_qubic = PARAMETERS["p_qubic"]
+        self.d_max = PARAMETERS["d_max"]
+        self.presolve = PARAMETERS["presolve"]
+        # earliest departure times shared by QUBO and ILP encoders through edt()
+        self.edt_table = edtTable(trains_routes["Routes"], self.trains_timing)
+        self.trains_timing["edt"] = self.edt_table
+        # integer interned, array backed view of the problem, dicts above are kept as compatibility layer
+        self.compiled = compileProblem(trains_routes, self.trains_timing)
+        self.trains_timing["compiled"] = self.compiled
+        # pruned delay domains used by QUBO indexing, all delays 0..d_max without presolve
+        self.trains_timing["domains"] = presolveDomains(self) if self.presolve else None
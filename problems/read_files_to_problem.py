@@ -2,8 +2,28 @@
 Read files to problem - file, which helps to read the data from .xml and .csv files. Helps to calculate and assgin values to problem.
 """
 import csv
+import itertools
 import xml.etree.ElementTree as ET
 
+class Route(list):
+    """
+    Route of the train - list of stations with precomputed position of each station and maps
+    of next and previous stations, so stations of the route are looked up in constant time
+    """
+    def __init__(self, stations=()):
+        super().__init__(stations)
+        self.position = {}
+        for i, s in enumerate(self):
+            self.position.setdefault(s, i)
+        # maps by first occurrence of the station, as route.index
+        self.next_station = {s: self[i + 1] for s, i in self.position.items() if i + 1 < len(self)}
+        self.previous_station = {s: self[i - 1] for s, i in self.position.items() if i > 0}
+
+    def index(self, s, *args):
+        if args or s not in self.position:
+            return super().index(s, *args)
+        return self.position[s]
+
 def readLocationLinksCsv():
     """
     Function to read location links data from CSV file
@@ -104,7 +124,7 @@ def calculateOutPenaltyStopRoutesT(trains, t_out, t_penalty, t_stop, Routes, T):
             else:
                 t_stop[train_id + '_' + event_info['stagename']] = 0
             
-        Routes[train_id] = route
+        Routes[train_id] = Route(route)
         T.append(train_id)
 
 def calculateHeadwayTrackT(Routes, t_headway, Ttrack, T1):
@@ -166,11 +186,11 @@ def fixedRepeatedValues(Ttrack, T1, Tswitch):
 
 def uniqueValues(lst):
     """
-    Function to make only uniquw Tswitch values
+    Function to make only uniquw Tswitch values (in order of first occurrence, so indexing does not depend on hash seed)
     """
-    unique_vals = set()
+    unique_vals = {}
     for sublist in lst:
-        unique_vals.update(sublist)
+        unique_vals.update(dict.fromkeys(sublist))
     return list(unique_vals)
 
 def mergeDictsInList(lst):
@@ -270,5 +290,39 @@ def assignValuesToProblem(t_pass, t_headway, t_stop, t_out, t_penalty, Routes, T
         "Ttrack": Ttrack,
         "Tswitch":Tswitch,
     }
+    trains_routes["Index"] = indexTrainSets(trains_routes)
+
+    return taus, trains_timing, trains_routes
+
+def trainPairs(vecofvec):
+    """
+    Function to return set of ordered pairs (a, b), a != b, of trains which occurs together in the same vector of vectors
+    """
+    return {pair for v in vecofvec for pair in itertools.permutations(v, 2) if pair[0] != pair[1]}
+
+def indexTrainSets(trains_routes):
+    """
+    Function to make hashed indexes of train sets, so the encoders check pairs of trains in O(1)
 
-    return taus, trains_timing, trains_routes
\ No newline at end of file
+    T0[(s, s1)] - set of (t, t1) pairs on single track line s -> s1
+    T1[(s, s_next)] - set of (t, t1) pairs with common line s -> s_next
+    Ttrack[s] - set of (t, t1) pairs with common track at station s
+    Tswitch[frozenset((t, t1))] - list of (s, pairs_of_switch) switches at stations s used by exactly trains t and t1
+    Tswitch_trains[t][s] - set of positions in Tswitch[s] of switches used by train t
+    """
+    index = {
+        "T0": {key: {tuple(pair) for pair in pairs} for key, pairs in trains_routes["T0"].items()},
+        "T1": {(s, s_next): trainPairs(ts) for s in trains_routes["T1"].keys() for s_next, ts in trains_routes["T1"][s].items()},
+        "Ttrack": {s: trainPairs(ts) for s, ts in trains_routes["Ttrack"].items()},
+        "Tswitch": {},
+        "Tswitch_trains": {},
+    }
+    for s in trains_routes["Tswitch"].keys():
+        for i, pairs_of_switch in enumerate(trains_routes["Tswitch"][s]):
+            if not isinstance(pairs_of_switch, dict):
+                continue
+            for t in pairs_of_switch.keys():
+                index["Tswitch_trains"].setdefault(t, {}).setdefault(s, set()).add(i)
+            if len(pairs_of_switch) == 2:
+                index["Tswitch"].setdefault(frozenset(pairs_of_switch.keys()), []).append((s, pairs_of_switch))
+    return index
\ No newline at end of file
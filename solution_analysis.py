@@ -1,16 +1,19 @@
 """
 Solution analysis - file, which prints all the solutions of the problem (linear, simulated quantum, quantum)
-example: python solution_analysis.py problem_number solution_type(console, png)
+example: python solution_analysis.py problem_number solution_type(console, png, energy, validate, repair) [workers]
 """
 import numpy as np
 import sys
 
 from encoders.ILP_encoder import printDeparture, solveLinearProblem, toHoursMinutes
-from encoders.QUBO_encoder import edt, indexingForQubo, makeQubo
+from encoders.QUBO_encoder import edt, indexingForQubo, quboFamilies, quboIndices, groupIndices
+from encoders.QUBO_validator import validateSamples, feasibleSamples, ruleConflicts, trackOccupationTriples
 from helpers.helpers_functions_PDF import trains_timings_to_pdf, trains_timings_to_png
-from helpers.helpers_functions_QUBO import energy, load_train_solution
-from helpers.helpers_functions import getProblem 
-from problems.read_files_to_problem import readScheduleXml
+from helpers.helpers_functions_QUBO import load_train_solution, loadSolutionStore, familyEnergies, verifyEnergies
+from helpers.helpers_functions_cache import cachedProblem
+from helpers.helpers_functions_matrix import loadQuboMatrix
+from helpers.helpers_functions_samples import topSamples, saveSampleStore
+from solvers.QUBO_repair import parallelRepair
 
 
 def visualise_solution(solution, Problem, num_brackets):
@@ -25,20 +28,19 @@ def visualise_solution(solution, Problem, num_brackets):
 
     print("-" * num_brackets + "TRAIN SCHEDULE" + "-" *num_brackets)
 
-    for i in range(q_bits):
-        if solution[i] == 1:
-            t = inds[i]["t"]
-            s = inds[i]["s"]
-            d = inds[i]["d"]
-            time = d + edt(trains_routes["Routes"], Problem.trains_timing, t, s)
-            print("Train", t, "goes from station", s, "(dep. time)", toHoursMinutes(int(time)), " with ", d, " minutes delay (original time", toHoursMinutes(int(edt(trains_routes["Routes"], Problem.trains_timing, t, s))),")")
+    for i in np.flatnonzero(np.asarray(solution[:q_bits]) == 1):
+        t = inds[i]["t"]
+        s = inds[i]["s"]
+        d = inds[i]["d"]
+        time = d + edt(trains_routes["Routes"], Problem.trains_timing, t, s)
+        print("Train", t, "goes from station", s, "(dep. time)", toHoursMinutes(int(time)), " with ", d, " minutes delay (original time", toHoursMinutes(int(edt(trains_routes["Routes"], Problem.trains_timing, t, s))),")")
     print("-" * 74)
 
 def print_solutions(f, Problem_original, i=""):
     """
     Function to print problem solution (energies and train schedule)
     """
-    solutions = load_train_solution(f, i)
+    solutions = load_train_solution(f, i, k=1)
     visualise_solution(solutions[0], Problem_original, 30)
 
 def print_quantum_trains_timings(Problem_original, problem_number, f_Q, num_brackets):
@@ -46,7 +48,6 @@ def print_quantum_trains_timings(Problem_original, problem_number, f_Q, num_brac
     Function to print problem solution using quantum annealing
     """
     print(">" * num_brackets + "QUANTUM SOLVER RESULTS" + "<" * num_brackets)
-    Q = np.load(f_Q)["Q"]
     for i in [3,3.5,4,4.5]:
          f = f"files/dwave_data/QUBO_complete_sol_real_anneal_problem{problem_number}_numread2000_antime240_chainst{i}"
          print_solutions(f, Problem_original, i)
@@ -57,7 +58,6 @@ def print_simulated_trains_timings(Problem_original, f_Q, num_brackets, problem_
     """
     Function to print problem solution using simulated quantum annealing
     """
-    Q = np.load(f_Q)["Q"]
     print(">" * num_brackets + "SIMULATED SOLVER RESULTS" + "<" * num_brackets)
     f = f"files/QUBO_complete_sol_sim_anneal{problem_number}"
     print_solutions(f, Problem_original)
@@ -82,18 +82,92 @@ def print_linear_trains_timings(problem, num_brackets):
     print(">" * num_brackets + end_message + "<" * num_brackets)
     print("\n")
 
-def print_all_solutions(problem, QMatrix, problem_file, problem_number, solution_type):
+def print_energy_breakdown(problem, problem_file, problem_number, k=10):
+    """
+    Function to print energies of k best simulated annealing samples split by constraint families,
+    energies returned by the solver are checked against the QUBO matrix
+    """
+    f = f"files/QUBO_complete_sol_sim_anneal{problem_number}"
+    store = loadSolutionStore(f)
+    rows, samples = topSamples(store, k)
+    Q = loadQuboMatrix(problem_file)
+    if samples.shape[1] != Q.shape[0]:
+        print(f"samples have {samples.shape[1]} variables, QUBO matrix has {Q.shape[0]}, solve the problem again")
+        return
+
+    breakdown = familyEnergies(samples, quboFamilies(problem))
+    agree = verifyEnergies(samples, np.asarray(store["energy"])[rows], Q, atol=1e-3)
+    print("read".ljust(6) + "energy".rjust(12) + "".join(name.rjust(18) for name in breakdown) + "  matches QUBO")
+    for j, row in enumerate(rows):
+        print(str(row).ljust(6) + f"{store['energy'][row]:12.3f}" + "".join(f"{values[j]:18.3f}" for values in breakdown.values()) + f"  {bool(agree[j])}")
+
+def print_violations(problem, problem_number):
+    """
+    Function to print violations of timetable rules in all simulated annealing samples and the best feasible sample
+    """
+    f = f"files/QUBO_complete_sol_sim_anneal{problem_number}"
+    store = loadSolutionStore(f)
+    rows, samples = topSamples(store, len(store["energy"]))
+    violations = validateSamples(problem, samples)
+    feasible = feasibleSamples(violations)
+
+    print("rule".ljust(18) + "reads".rjust(8) + "violations".rjust(12))
+    for rule, counts in violations.items():
+        print(rule.ljust(18) + f"{np.count_nonzero(counts):8d}" + f"{counts.sum():12d}")
+    print(f"feasible reads: {np.count_nonzero(feasible)} of {len(rows)}")
+    if feasible.any():
+        print(f"best feasible read {rows[feasible][0]} with energy {store['energy'][rows[feasible][0]]:.3f}")
+
+def print_repair(problem, problem_file, problem_number, workers=1):
+    """
+    Function to repair all simulated annealing samples greedily, print how many of them became feasible and their energies,
+    repaired samples are saved next to the original ones
+    """
+    f = f"files/QUBO_complete_sol_sim_anneal{problem_number}"
+    store = loadSolutionStore(f)
+    rows, samples = topSamples(store, len(store["energy"]))
+    Q = loadQuboMatrix(problem_file)
+    if samples.shape[1] != Q.shape[0]:
+        print(f"samples have {samples.shape[1]} variables, QUBO matrix has {Q.shape[0]}, solve the problem again")
+        return
+
+    inds, _, _, _ = quboIndices(problem)
+    groups = groupIndices(inds)
+    conflicts = sum(ruleConflicts(problem, inds, groups).values())
+    triples = trackOccupationTriples(problem, inds, groups)
+    repaired, energies = parallelRepair(Q, list(groups.values()), samples, conflicts, workers, triples=triples)
+    before = feasibleSamples(validateSamples(problem, samples, inds, groups))
+    after = feasibleSamples(validateSamples(problem, repaired, inds, groups))
+    original = np.asarray(store["energy"])[rows]
+
+    print(f"feasible reads before repair: {np.count_nonzero(before)} of {len(rows)}, after repair: {np.count_nonzero(after)}")
+    print(f"mean energy before repair: {original.mean():.3f}, after repair: {energies.mean():.3f}")
+    if after.any():
+        best = np.argmin(np.where(after, energies, np.inf))
+        print(f"best feasible repaired read {rows[best]} with energy {energies[best]:.3f} (before repair {original[best]:.3f})")
+    saveSampleStore(f + "_repaired", repaired, energies, np.asarray(store["num_occurrences"])[rows], repaired_from=f)
+
+def print_all_solutions(problem, problem_file, problem_number, solution_type, workers=1):
     """
     Function to print all problem solutions (linear, simulated, quantums)
     """
     if (solution_type == 'console'):
-        trains_timings_to_console(problem, problem_number, QMatrix, problem_file)
+        trains_timings_to_console(problem, problem_number, problem_file)
 
     if (solution_type == 'png'):
         trains_timings_to_pdf(problem, problem_file, problem_number)
         trains_timings_to_png(problem, problem_file, problem_number)
 
-def trains_timings_to_console(problem, problem_number, QMatrix, problem_file):
+    if (solution_type == 'energy'):
+        print_energy_breakdown(problem, problem_file, problem_number)
+
+    if (solution_type == 'validate'):
+        print_violations(problem, problem_number)
+
+    if (solution_type == 'repair'):
+        print_repair(problem, problem_file, problem_number, workers)
+
+def trains_timings_to_console(problem, problem_number, problem_file):
     print_linear_trains_timings(problem, 30)
     print_simulated_trains_timings(problem, problem_file, 30, problem_number)
     print_quantum_trains_timings(problem, problem_number, problem_file, 30)
@@ -101,11 +175,9 @@ def trains_timings_to_console(problem, problem_number, QMatrix, problem_file):
 if __name__ == "__main__":
     problem_number = int(sys.argv[1]) 
     solution_type = str(sys.argv[2]) 
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
     output_xml_file = f"data/LDZ_timetable_filtered{problem_number}.xml"
-    taus, trains_timing, trains_routes = readScheduleXml(output_xml_file)
-    
-    prob = getProblem(problem_number, taus, trains_timing, trains_routes)
+    prob = cachedProblem(output_xml_file, problem_number)
     prob_file = f'files/QUBO_matrix{problem_number}.npz'
-    Q = makeQubo(prob)
 
-    print_all_solutions(prob, Q, prob_file, problem_number, solution_type)
+    print_all_solutions(prob, prob_file, problem_number, solution_type, workers)
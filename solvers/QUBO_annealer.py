@@ -0,0 +1,275 @@
+"""
+Local QUBO solver - simulated annealing and tabu search written in NumPy, working on the sparse QUBO matrix
+
+Many replicas (reads) are updated in lockstep as rows of one array. Energy changes of flips are computed
+from local fields h + W x kept up to date after every flip, so the energy is never recomputed from scratch.
+Variables are updated by colour classes of the coupling graph, variables of one class are not coupled,
+so their flips can be decided at once with exact energy changes.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from helpers.helpers_functions_QUBO import energies
+
+def quboFields(Q):
+    """
+    Function to return linear biases h and symmetric coupling matrix W (CSR, zero diagonal) of QUBO matrix,
+    energy is h x + x W x / 2
+    """
+    Q = sp.csr_matrix(Q, dtype=np.float64)
+    U = sp.triu(Q, k=1) + sp.triu(Q.T, k=1)
+    W = sp.csr_matrix(U + U.T)
+    W.eliminate_zeros()
+    return Q.diagonal().copy(), W
+
+def quboEnergies(Q, X):
+    """
+    Function to compute energies x Q x of all samples (rows of X)
+    """
+    return energies(X, Q)
+
+def colourClasses(W):
+    """
+    Function to split variables to classes of not coupled variables (greedy colouring of the coupling graph)
+    """
+    n = W.shape[0]
+    colour = np.full(n, -1, dtype=np.int64)
+    degree = np.diff(W.indptr)
+    for i in np.argsort(-degree, kind="stable"):
+        used = set(colour[W.indices[W.indptr[i]:W.indptr[i + 1]]].tolist())
+        c = 0
+        while c in used:
+            c += 1
+        colour[i] = c
+    return [np.flatnonzero(colour == c) for c in range(colour.max() + 1)] if n else []
+
+def defaultBetaRange(h, W):
+    """
+    Function to return default inverse temperatures: hot enough to flip the largest energy change with probability 1/2,
+    cold enough to flip the smallest one with probability 1/100
+    """
+    field = np.abs(h) + np.asarray(abs(W).sum(axis=1)).ravel()
+    coefficients = np.concatenate([np.abs(h), np.abs(W.data)])
+    coefficients = coefficients[coefficients > 0]
+    if len(coefficients) == 0:
+        return 0.1, 1.0
+    return np.log(2) / field.max(), np.log(100) / coefficients.min()
+
+def betaSchedule(beta_range, num_sweeps, beta_schedule_type="geometric"):
+    """
+    Function to return inverse temperature of every sweep
+    """
+    if beta_schedule_type == "linear":
+        return np.linspace(beta_range[0], beta_range[1], num_sweeps)
+    return np.geomspace(beta_range[0], beta_range[1], num_sweeps)
+
+def simulatedAnnealing(Q, num_reads=100, num_sweeps=1000, beta_range=None, beta_schedule_type="geometric", seed=None, initial=None, schedule=None):
+    """
+    Function to run simulated annealing of num_reads replicas in lockstep,
+    schedule - inverse temperatures of sweeps (replaces num_sweeps, beta_range and beta_schedule_type)
+
+    Returns samples (num_reads x n, uint8) and their energies, best state met by each replica is returned
+    """
+    h, W = quboFields(Q)
+    n = len(h)
+    rng = np.random.default_rng(seed)
+    # replicas are columns, so variables of one class are contiguous rows
+    X = rng.integers(0, 2, (n, num_reads)).astype(np.float64) if initial is None else np.array(initial, dtype=np.float64).T.copy()
+    F = np.asarray(W @ X)
+    E = h @ X + 0.5 * np.einsum("ir,ir->r", X, F)
+    best_X, best_E = X.copy(), E.copy()
+    if schedule is None:
+        schedule = betaSchedule(beta_range or defaultBetaRange(h, W), num_sweeps, beta_schedule_type)
+    classes = colourClasses(W)
+    # columns of W of every class as CSR, so field update is one sparse product per class
+    columns = [sp.csr_matrix(W[:, c]) for c in classes]
+    fields = [h[c][:, None] for c in classes]
+
+    for beta in schedule:
+        thresholds = np.log(rng.random((n, num_reads))) / -beta
+        for c, W_c, h_c in zip(classes, columns, fields):
+            sign = 1 - 2 * X[c]
+            delta = sign * (h_c + F[c])
+            # Metropolis rule, exp(-beta delta) > u is delta < -log(u) / beta
+            flip = delta < thresholds[c]
+            change = sign * flip
+            X[c] += change
+            F += W_c @ change
+            E += (delta * flip).sum(axis=0)
+        better = E < best_E
+        best_X[:, better], best_E[better] = X[:, better], E[better]
+    return best_X.T.astype(np.uint8), best_E
+
+def tabuSearch(Q, num_reads=100, num_steps=1000, tenure=None, seed=None, initial=None):
+    """
+    Function to run tabu search of num_reads replicas in lockstep, each step every replica flips its best variable
+    which is not tabu (flipped in last tenure steps) unless the flip gives the best energy of the replica
+
+    Returns samples (num_reads x n, uint8) and their energies, best state met by each replica is returned
+    """
+    h, W = quboFields(Q)
+    n = len(h)
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 2, (num_reads, n)).astype(np.float64) if initial is None else np.array(initial, dtype=np.float64)
+    F = np.asarray((W @ X.T).T)
+    E = X @ h + 0.5 * np.einsum("ri,ri->r", X, F)
+    best_X, best_E = X.copy(), E.copy()
+    if tenure is None:
+        tenure = min(20, n // 4)
+    tabu_until = np.zeros((num_reads, n), dtype=np.int64)
+    replicas = np.arange(num_reads)
+
+    for step in range(num_steps):
+        delta = (1 - 2 * X) * (h + F)
+        allowed = (tabu_until <= step) | (E[:, None] + delta < best_E[:, None])
+        # random tie breaking between moves with the same energy change
+        i = np.argmin(np.where(allowed, delta + 1e-9 * rng.random(delta.shape), np.inf), axis=1)
+        move = allowed[replicas, i]
+        change = np.where(move, 1 - 2 * X[replicas, i], 0.0)
+        X[replicas, i] += change
+        F += np.asarray(W[i].multiply(change[:, None]).todense())
+        E += np.where(move, delta[replicas, i], 0.0)
+        tabu_until[replicas[move], i[move]] = step + 1 + tenure
+        better = E < best_E
+        best_X[better], best_E[better] = X[better], E[better]
+    return best_X.astype(np.uint8), best_E
+
+def moveUnits(n, groups):
+    """
+    Function to return padded members of move units (one hot groups and single variables not in any group),
+    their sizes, whether they are groups and unit of every variable
+    """
+    in_group = np.zeros(n, dtype=bool)
+    units = []
+    for members in groups:
+        members = np.asarray(members, dtype=np.int64)
+        in_group[members] = True
+        units.append(members)
+    grouped = np.arange(len(units) + np.count_nonzero(~in_group)) < len(units)
+    units += [np.array([k]) for k in np.flatnonzero(~in_group)]
+    sizes = np.array([len(u) for u in units], dtype=np.int64)
+    members = np.zeros((len(units), sizes.max() if len(units) else 1), dtype=np.int64)
+    unit_of = np.empty(n, dtype=np.int64)
+    for u, unit in enumerate(units):
+        members[u, :len(unit)] = unit
+        unit_of[unit] = u
+    return members, sizes, grouped, unit_of
+
+def unitCouplings(W, unit_of, n_units):
+    """
+    Function to return coupling graph of move units (CSR, zero diagonal), units are coupled if any of their variables are
+    """
+    P = sp.csr_matrix((np.ones(len(unit_of)), (np.arange(len(unit_of)), unit_of)), shape=(len(unit_of), n_units))
+    U = sp.csr_matrix(P.T @ abs(W) @ P)
+    U.setdiag(0)
+    U.eliminate_zeros()
+    return U
+
+def innerCouplings(W, members, sizes, units):
+    """
+    Function to return couplings inside move units W[members[u, p], members[u, q]] (units x size x size), zero for other units
+    """
+    inner = np.zeros((len(sizes), members.shape[1], members.shape[1]))
+    for u in np.flatnonzero(units):
+        inner[u, :sizes[u], :sizes[u]] = W[members[u, :sizes[u]]][:, members[u, :sizes[u]]].toarray()
+    return inner
+
+def attachedAuxiliaries(W, unit_of, members, sizes, units, auxiliary):
+    """
+    Function to return auxiliary variables attached to move units - coupled to the unit and not coupled to other auxiliary
+    variables, so their optimal value follows from their local field: attachment pairs (unit, variable),
+    couplings W[variable, members[unit, p]] of pairs (pairs x size) and attachment matrix (auxiliary variables x units)
+    """
+    n = len(unit_of)
+    free = np.flatnonzero(auxiliary & (np.diff(sp.csr_matrix(W[:, auxiliary]).indptr) == 0))
+    P = sp.csr_matrix((units[unit_of].astype(np.float64), (np.arange(n), unit_of)), shape=(n, len(sizes)))
+    A = sp.csc_matrix(abs(W[free]) @ P)
+    A.eliminate_zeros()
+    pair_unit = np.repeat(np.arange(len(sizes)), np.diff(A.indptr))
+    pair_variable = free[A.indices]
+    couplings = np.zeros((len(pair_unit), members.shape[1]))
+    for u in np.flatnonzero(np.diff(A.indptr)):
+        pairs = slice(A.indptr[u], A.indptr[u + 1])
+        couplings[pairs, :sizes[u]] = W[pair_variable[pairs]][:, members[u, :sizes[u]]].toarray()
+    return pair_unit, pair_variable, couplings, sp.csr_matrix(A)
+
+def swapAnnealing(Q, groups, num_reads=100, num_sweeps=1000, beta_range=None, beta_schedule_type="geometric", seed=None, schedule=None):
+    """
+    Function to run simulated annealing which keeps exactly one qubit of every group (one hot delays of train at station) set,
+    move of a group moves its qubit to another delay of the group and sets auxiliary variables attached to the group
+    (z = x x1 of Rosenberg reduction) to their optimal value, all auxiliary variables are flipped as well
+
+    Returns samples (num_reads x n, uint8) and their energies, best state met by each replica is returned
+    """
+    h, W = quboFields(Q)
+    n = len(h)
+    rng = np.random.default_rng(seed)
+    members, sizes, grouped, unit_of = moveUnits(n, groups)
+    n_units = len(sizes)
+    swaps = grouped & (sizes > 1)
+    inner = innerCouplings(W, members, sizes, swaps)
+    pair_unit, pair_variable, pair_couplings, A = attachedAuxiliaries(W, unit_of, members, sizes, swaps, ~grouped[unit_of])
+
+    # replicas are columns, random one hot state of groups (groups with one qubit are fixed) and random auxiliary variables
+    position = np.floor(rng.random((n_units, num_reads)) * sizes[:, None]).astype(np.int64)
+    X = np.zeros((n, num_reads))
+    X[np.take_along_axis(members[grouped], position[grouped], 1), np.arange(num_reads)] = 1
+    flips = np.flatnonzero(~grouped)
+    X[members[flips, 0]] = rng.integers(0, 2, (len(flips), num_reads))
+    F = np.asarray(W @ X)
+    E = h @ X + 0.5 * np.einsum("ir,ir->r", X, F)
+    best_X, best_E = X.copy(), E.copy()
+    if schedule is None:
+        schedule = betaSchedule(beta_range or defaultBetaRange(h, W), num_sweeps, beta_schedule_type)
+
+    # units sharing an attached auxiliary variable are coupled as well, so moves of one class stay exact
+    U = sp.csr_matrix(unitCouplings(W, unit_of, n_units) + abs(A.T) @ abs(A))
+    U.setdiag(0)
+    U.eliminate_zeros()
+    classes = []
+    for units in colourClasses(U):
+        swap_units, flip_units = units[swaps[units]], units[~grouped[units]]
+        # attachment pairs of swap units of the class, summed to units by matrix S (swap units x pairs)
+        pairs = np.flatnonzero(np.isin(pair_unit, swap_units))
+        pair_swap = np.searchsorted(swap_units, pair_unit[pairs])
+        S = sp.csr_matrix((np.ones(len(pairs)), (pair_swap, np.arange(len(pairs)))), shape=(len(swap_units), len(pairs)))
+        attached = (pair_swap, pair_variable[pairs], pair_couplings[pairs], S)
+        variables = np.concatenate([members[u, :sizes[u]] for u in units] + [pair_variable[pairs]])
+        local = np.zeros(n, dtype=np.int64)
+        local[variables] = np.arange(len(variables))
+        classes.append((swap_units, members[flip_units, 0], variables, local, attached, sp.csr_matrix(W[:, variables])))
+
+    for beta in schedule:
+        for swap_units, flip_variables, variables, local, (pair_swap, z, couplings, S), W_c in classes:
+            change = np.zeros((len(variables), num_reads))
+            # delay swap, Δ = (h_new + F_new) - (h_old + F_old) - W[old, new] + Σ Δz (h_z + F_z after the swap) of attached z
+            if len(swap_units):
+                old_position = position[swap_units]
+                new_position = np.floor(rng.random(old_position.shape) * (sizes[swap_units, None] - 1)).astype(np.int64)
+                new_position += new_position >= old_position
+                old = np.take_along_axis(members[swap_units], old_position, 1)
+                new = np.take_along_axis(members[swap_units], new_position, 1)
+                replicas = np.broadcast_to(np.arange(num_reads), old.shape)
+                delta = (h[new] + F[new, replicas]) - (h[old] + F[old, replicas]) - inner[swap_units[:, None], old_position, new_position]
+                rows = np.arange(len(z))[:, None]
+                field = h[z, None] + F[z] + couplings[rows, new_position[pair_swap]] - couplings[rows, old_position[pair_swap]]
+                z_change = (field < 0) - X[z]
+                delta += S @ (z_change * field)
+                accept = delta < np.log(rng.random(delta.shape)) / -beta
+                change[local[z]] = z_change * accept[pair_swap]
+                change[local[old], replicas] = -1.0 * accept
+                change[local[new], replicas] = accept
+                position[swap_units] = np.where(accept, new_position, old_position)
+                E += (delta * accept).sum(axis=0)
+            # flip of variables out of groups
+            if len(flip_variables):
+                sign = 1 - 2 * X[flip_variables]
+                delta = sign * (h[flip_variables, None] + F[flip_variables])
+                accept = delta < np.log(rng.random(delta.shape)) / -beta
+                change[local[flip_variables]] = sign * accept
+                E += (delta * accept).sum(axis=0)
+            X[variables] += change
+            F += W_c @ change
+        better = E < best_E
+        best_X[:, better], best_E[better] = X[:, better], E[better]
+    return best_X.T.astype(np.uint8), best_E
@@ -0,0 +1,184 @@
+"""
+Greedy repair of annealing samples
+
+Each sample is first made one hot: every group (delays of train at station) without exactly one qubit set
+gets the single qubit of the lowest energy, given the rest of the sample. If pairs of qubits in conflict
+(ruleConflicts of the decoded timetable) or triples of them (trackOccupationTriples) are given, groups are swept
+in route order and each one moves to the delay with the fewest conflicts (lowest energy among them),
+so delays are pushed along the route.
+Then steepest descent is run with delay swaps inside groups and flips of auxiliary variables, until
+no move lowers the energy (swaps adding conflicts are not taken). Samples are repaired in lockstep, chunks of samples in parallel processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import scipy.sparse as sp
+
+from solvers.QUBO_annealer import quboFields, moveUnits, innerCouplings
+
+def oneHotRepair(h, W, X, F, members, sizes, grouped):
+    """
+    Function to set exactly one qubit of the lowest energy in every group which is not one hot (X, F updated in place)
+    """
+    for u in np.flatnonzero(grouped):
+        group = members[u, :sizes[u]]
+        broken = np.flatnonzero(X[group].sum(axis=0) != 1)
+        if len(broken) == 0:
+            continue
+        W_g = W[:, group]
+        change = -X[np.ix_(group, broken)]
+        F[:, broken] += W_g @ change
+        X[np.ix_(group, broken)] = 0
+        best = np.argmin(h[group, None] + F[np.ix_(group, broken)], axis=0)
+        change = np.zeros((len(group), len(broken)))
+        change[best, np.arange(len(broken))] = 1
+        F[:, broken] += W_g @ change
+        X[np.ix_(group, broken)] = change
+
+def tripleRotations(triples, n_x):
+    """
+    Function to return triples of qubits in conflict taken once from each of their three qubits:
+    sparse matrix (qubits x rotations) of the qubit of rotation and the other two qubits of rotations
+    """
+    rotations = np.concatenate([triples, triples[:, [1, 2, 0]], triples[:, [2, 0, 1]]])
+    T = sp.csr_matrix((np.ones(len(rotations)), (rotations[:, 0], np.arange(len(rotations)))), shape=(n_x, len(rotations)))
+    return T, rotations[:, 1], rotations[:, 2]
+
+def conflictCounts(conflicts, rotations, X):
+    """
+    Function to return numbers of conflicts of x qubits with the rest of the samples (x qubits x samples),
+    conflicts - symmetric sparse matrix of pairs, rotations - triples of tripleRotations
+    """
+    T, a, b = rotations
+    x = X[:conflicts.shape[0]]
+    return np.asarray(conflicts @ x) + T @ (x[a] * x[b])
+
+def conflictSweeps(h, W, X, F, members, sizes, units, conflicts, rotations, max_sweeps=10, tolerance=1e-9):
+    """
+    Function to move each group (in given order) to the delay with the fewest conflicts with other groups
+    (pairs of qubits in conflicts, triples of rotations), ties by the lowest energy, until no group moves
+    (X, F updated in place); the first sweep counts only conflicts with groups visited before,
+    so delays are pushed forward along the routes
+    """
+    n_x = conflicts.shape[0]
+    replicas = np.arange(X.shape[1])
+    visited = np.zeros(n_x)
+    T, a, b = rotations
+    unit_rotations = {}
+    for u in units:
+        T_g = T[members[u, :sizes[u]]]
+        used = np.unique(T_g.indices)
+        unit_rotations[u] = (sp.csr_matrix(T_g[:, used]), a[used], b[used])
+    for sweep in range(max_sweeps):
+        moved = False
+        for u in units:
+            group = members[u, :sizes[u]]
+            current = X[group]
+            W_g = W[:, group]
+            inner = W_g[group].toarray()
+            if sweep == 0:
+                others = X[:n_x] * visited[:, None]
+                visited[group] = 1
+            else:
+                others = X[:n_x]
+            T_g, a, b = unit_rotations[u]
+            conflict = np.asarray(conflicts[group] @ others) + T_g @ (others[a] * others[b])
+            # energy of the group qubit k given the rest of the sample
+            field = h[group, None] + F[group] - inner @ current
+            fewest = conflict.min(axis=0)
+            best = np.argmin(np.where(conflict == fewest, field, np.inf), axis=0)
+            old = np.argmax(current, axis=0)
+            better = (fewest < conflict[old, replicas]) | ((fewest == conflict[old, replicas]) & (field[best, replicas] < field[old, replicas] - tolerance))
+            if not better.any():
+                continue
+            moved = True
+            change = np.zeros_like(current)
+            change[old[better], replicas[better]] = -1
+            change[best[better], replicas[better]] += 1
+            X[group] += change
+            F += W_g @ change
+        if not moved and sweep > 0:
+            break
+
+def greedyRepair(Q, groups, X, conflicts=None, max_steps=None, tolerance=1e-9, triples=None):
+    """
+    Function to repair samples (rows of X): one hot groups, conflict sweeps (if conflicts - sparse matrix of pairs
+    of x qubits in conflict - or triples - array (m x 3) of x qubits in conflict when all three are set - are given),
+    then steepest descent by delay swaps and auxiliary flips, which takes no swap adding conflicts
+
+    Returns repaired samples (uint8) and their energies
+    """
+    h, W = quboFields(Q)
+    n = len(h)
+    members, sizes, grouped, _ = moveUnits(n, groups)
+    swaps = grouped & (sizes > 1)
+    inner = innerCouplings(W, members, sizes, swaps)
+    X = np.array(X, dtype=np.float64).T
+    num_reads = X.shape[1]
+    F = np.asarray(W @ X)
+    oneHotRepair(h, W, X, F, members, sizes, grouped)
+    swap_units = np.flatnonzero(swaps)
+    checked = conflicts is not None or triples is not None
+    if checked:
+        conflicts = sp.csr_matrix(conflicts + conflicts.T, dtype=np.float64) if conflicts is not None else sp.csr_matrix((n, n))
+        rotations = tripleRotations(np.zeros((0, 3), dtype=np.int64) if triples is None else triples, conflicts.shape[0])
+        conflictSweeps(h, W, X, F, members, sizes, swap_units, conflicts, rotations, tolerance=tolerance)
+
+    flip_variables = members[~grouped, 0]
+    padded = np.arange(members.shape[1])[None, :] < sizes[swap_units, None]
+    replicas = np.arange(num_reads)
+    if max_steps is None:
+        max_steps = 10 * n
+
+    for _ in range(max_steps):
+        # delay swap of group u from qubit old to qubit new: (h_new + F_new) - (h_old + F_old) - W[old, new]
+        candidates = members[swap_units]
+        position = np.argmax(X[candidates], axis=1)
+        old = np.take_along_axis(candidates, position, 1)
+        field = h[candidates][:, :, None] + F[candidates]
+        old_field = np.take_along_axis(field, position[:, None, :], 1)
+        coupling = np.take_along_axis(inner[swap_units], position[:, None, :].transpose(0, 2, 1), 1).transpose(0, 2, 1)
+        delta_swap = field - old_field - coupling
+        if checked:
+            counts = conflictCounts(conflicts, rotations, X)[candidates]
+            delta_swap[counts > np.take_along_axis(counts, position[:, None, :], 1)] = np.inf
+        delta_swap[~np.broadcast_to(padded[:, :, None], delta_swap.shape)] = np.inf
+        delta_swap[np.arange(len(swap_units))[:, None], position, replicas[None, :]] = np.inf
+        delta_swap = delta_swap.reshape(-1, num_reads)
+        delta_flip = (1 - 2 * X[flip_variables]) * (h[flip_variables, None] + F[flip_variables])
+
+        best_swap = np.argmin(delta_swap, axis=0) if len(delta_swap) else np.zeros(num_reads, dtype=np.int64)
+        best_flip = np.argmin(delta_flip, axis=0) if len(delta_flip) else np.zeros(num_reads, dtype=np.int64)
+        gain_swap = delta_swap[best_swap, replicas] if len(delta_swap) else np.full(num_reads, np.inf)
+        gain_flip = delta_flip[best_flip, replicas] if len(delta_flip) else np.full(num_reads, np.inf)
+        swap = (gain_swap <= gain_flip) & (gain_swap < -tolerance)
+        flip = (gain_flip < gain_swap) & (gain_flip < -tolerance)
+        if not (swap.any() or flip.any()):
+            break
+
+        r_swap = replicas[swap]
+        u, p = np.divmod(best_swap[swap], members.shape[1])
+        r_flip = replicas[flip]
+        flipped = flip_variables[best_flip[flip]] if len(flip_variables) else np.zeros(0, dtype=np.int64)
+        rows = np.concatenate([old[u, r_swap], candidates[u, p], flipped])
+        cols = np.concatenate([r_swap, r_swap, r_flip])
+        values = np.concatenate([-np.ones(len(r_swap)), np.ones(len(r_swap)), 1 - 2 * X[flipped, r_flip]])
+        change = sp.csr_matrix((values, (rows, cols)), shape=(n, num_reads))
+        X[rows, cols] += values
+        F += (W @ change).toarray()
+
+    energies = h @ X + 0.5 * np.einsum("ir,ir->r", X, F)
+    return X.T.astype(np.uint8), energies
+
+def parallelRepair(Q, groups, X, conflicts=None, workers=1, max_steps=None, triples=None):
+    """
+    Function to repair samples split in chunks across workers (processes), returns repaired samples and their energies
+    """
+    X = np.asarray(X)
+    chunks = [chunk for chunk in np.array_split(X, max(1, min(workers, len(X)))) if len(chunk)]
+    if len(chunks) <= 1:
+        return greedyRepair(Q, groups, X, conflicts, max_steps, triples=triples)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        results = list(executor.map(partial(greedyRepair, triples=triples), [Q] * len(chunks), [groups] * len(chunks), chunks, [conflicts] * len(chunks), [max_steps] * len(chunks)))
+    return np.concatenate([samples for samples, _ in results]), np.concatenate([energies for _, energies in results])
@@ -0,0 +1,5 @@
+"""
+Local solvers of QUBO written in NumPy
+"""
+from solvers.QUBO_annealer import simulatedAnnealing, swapAnnealing, tabuSearch, quboEnergies
+from solvers.QUBO_repair import greedyRepair, parallelRepair